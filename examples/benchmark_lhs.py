@@ -0,0 +1,38 @@
+"""benchmark of latin hypercube criteria over growing sample sizes
+
+    python examples/benchmark_lhs.py --sizes 100 1000 5000 --factors 10
+
+For each criterion and size: run time, max absolute correlation between
+factors and minimum distance between points.
+"""
+from __future__ import print_function, absolute_import
+import argparse
+import time
+import numpy as np
+from runner.lib.doelhs import lhs, _maxcorr, _mindist
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--factors', type=int, default=10)
+    parser.add_argument('--criteria', nargs='+', default=['random', 'correlation', 'maximin', 'centermaximin', 'ese'])
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--maxtime', type=float, default=10, help='time budget for ese (seconds)')
+    parser.add_argument('--seed', type=int, default=0)
+    o = parser.parse_args(argv)
+
+    print('{:>14} {:>7} {:>9} {:>9} {:>9}'.format('criterion', 'size', 'time (s)', 'max corr', 'min dist'))
+    for size in o.sizes:
+        for criterion in o.criteria:
+            np.random.seed(o.seed)
+            start = time.time()
+            H = lhs(o.factors, size, None if criterion == 'random' else criterion,
+                    o.iterations, o.maxtime if criterion == 'ese' else None)
+            elapsed = time.time() - start
+            print('{:>14} {:>7} {:9.3f} {:9.4f} {:9.4f}'.format(
+                criterion, size, elapsed, _maxcorr(H), _mindist(H)))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,9 @@
 input: "aa" and "bb" parameters 
     param file in json format, or command line
 
+multi-run: with --manifest, run every directory listed in the manifest file,
+    reading parameters from --params-file relative to each of them
+
 output "aa" and "bb":
     output.json : output aa and bb
     output : output aa and bb
@@ -14,7 +17,8 @@ import json
 import argparse 
 
 parser = argparse.ArgumentParser(description=__doc__)
-parser.add_argument('out')
+parser.add_argument('out', nargs='?')
+parser.add_argument('--manifest')
 parser.add_argument('--params-file')
 parser.add_argument('--aa', type=float)
 parser.add_argument('--bb', type=float)
@@ -23,39 +27,51 @@ parser.add_argument('--hang-if-not-aa', action='store_true')
 
 o = parser.parse_args()
 
-# define parameters
-aa = 1
-bb = 2
 
-# ...from file
-if o.params_file:
-    params = json.load(open(o.params_file))
-    aa = params.pop('aa', aa)
-    bb = params.pop('bb', bb)
+def run(out, params_file=None):
+
+    # define parameters
+    aa = 1
+    bb = 2
+
+    # ...from file
+    if params_file:
+        params = json.load(open(params_file))
+        aa = params.pop('aa', aa)
+        bb = params.pop('bb', bb)
+
+    # ...from command-line
+    if o.aa is not None: aa = o.aa
+    if o.bb is not None: bb = o.bb
+
+    sleep = o.sleep
+    if o.hang_if_not_aa and not aa:
+        sleep = 100
 
-# ...from command-line
-if o.aa is not None: aa = o.aa
-if o.bb is not None: bb = o.bb
+    if sleep:
+        print('wait '+str(sleep)+' sec')
+        time.sleep(sleep)
 
-if o.hang_if_not_aa and not aa:
-    o.sleep = 100
+    # output variables
+    output = {'aa':aa,'bb':bb}
 
-if o.sleep:
-    print('wait '+str(o.sleep)+' sec')
-    time.sleep(o.sleep)
+    print("Model state:", output)
 
-# output variables
-output = {'aa':aa,'bb':bb}
+    path = os.path.join(out, 'output')
 
-print("Model state:", output)
+    print("Write output to", path)
+    with open(path, 'w') as f:
+        for k in output:
+            f.write("{} {}\n".format(k, output[k]))
 
-path = os.path.join(o.out, 'output')
+    print("Write output to", path+'.json')
+    with open(path+'.json', 'w') as f:
+        json.dump(output, f, sort_keys=True)
 
-print("Write output to", path)
-with open(path, 'w') as f:
-    for k in output:
-        f.write("{} {}\n".format(k, output[k]))
 
-print("Write output to", path+'.json')
-with open(path+'.json', 'w') as f:
-    json.dump(output, f, sort_keys=True)
+if o.manifest:
+    for rundir in open(o.manifest).read().split('\n'):
+        if rundir:
+            run(rundir, o.params_file and os.path.join(rundir, o.params_file))
+else:
+    run(o.out, o.params_file)
@@ -0,0 +1,17 @@
+"""vectorized python model, as an example
+
+    job run -m examples/emulator.py -p a=0,1,2 b=0,1 -o out
+"""
+import numpy as np
+from runner.model import VectorModelInterface
+
+
+def emulator(xparams):
+    """whole ensemble at once: XParams (N, p) -> array (N, 2)
+    """
+    a = xparams.values[:, xparams.names.index('a')]
+    b = xparams.values[:, xparams.names.index('b')]
+    return np.column_stack([a*b + 1, np.exp(-a)])
+
+
+mymodel = VectorModelInterface(emulator, output_names=['cc', 'dd'])
@@ -0,0 +1,16 @@
+"""in-process python model, as an example
+
+    job run -m examples/surrogate.py -p a=0,1,2 b=0,1 -o out
+"""
+from runner.model import PythonModelInterface
+
+
+def surrogate(params):
+    """cheap emulator: params dict -> output dict
+    """
+    a = params.get('a', 1)
+    b = params.get('b', 0)
+    return {'aa': a, 'bb': b, 'cc': a*b + 1}
+
+
+mymodel = PythonModelInterface(surrogate)
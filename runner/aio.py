@@ -0,0 +1,141 @@
+"""Asyncio engine: run many model subprocesses from one event loop
+
+Each run in flight is a coroutine waiting for its subprocess, instead of a
+worker process blocking in `subprocess.check_call`. This is useful for
+I/O-bound models or external binaries, where thousands of runs may be in
+flight at once. Requires python 3.5+.
+"""
+from __future__ import absolute_import
+import sys
+import time
+import asyncio
+import subprocess
+import multiprocessing
+from runner.model import _killpg, PythonModelInterface
+
+
+async def arun(interface, rundir, params, background=True, shell=False, timeout=None, cache=None, record_start=True, timing=None):
+    """Coroutine counterpart of `ModelInterface.run`
+
+    Same steps (setup, subprocess, postprocess) and same runner.json record.
+    The model runs in its own process group, killed after `timeout` seconds.
+    Timings do not include child CPU time and memory.
+    """
+    if isinstance(interface, PythonModelInterface):
+        return interface.run(rundir, params, timing=timing)  # in-process, nothing to await
+
+    start = time.time()
+    args, workdir, env, info = interface._prepare(rundir, params, record_start)
+    info['timing'] = times = timing if timing is not None else {}
+    times['setup'] = time.time() - start
+
+    if cache is not None:
+        key = interface._cache_key(rundir, args, env, workdir, info)
+        times['wall'] = time.time() - start
+        output = interface._restore(rundir, cache, key, info)
+        if output is not None:
+            return output
+
+    stdout, stderr = interface._logfiles(rundir, background)
+    kw = dict(env=env, cwd=workdir, stdout=stdout, stderr=stderr, start_new_session=True)
+    proc = None
+
+    try:
+        try:
+            if shell:
+                proc = await asyncio.create_subprocess_shell(" ".join(args), **kw)
+            else:
+                proc = await asyncio.create_subprocess_exec(*args, **kw)
+        except OSError:
+            raise OSError("FAILED TO EXECUTE: `"+" ".join(args)+"` FROM `"+workdir+"`")
+
+        t0 = time.time()
+        try:
+            returncode = await asyncio.wait_for(proc.wait(), timeout)
+        except asyncio.TimeoutError:
+            raise multiprocessing.TimeoutError(str(timeout))
+        times['run'] = time.time() - t0
+        info['returncode'] = returncode
+
+        if returncode:
+            raise subprocess.CalledProcessError(returncode, args)
+
+        info['status'] = 'success'
+        t0 = time.time()
+        info['output'] = output = interface.postprocess(rundir)
+        times['postprocess'] = time.time() - t0
+        if cache is not None:
+            info['cache_key'] = key
+            cache.put(key, rundir)
+
+    except BaseException:
+        info['status'] = 'failed'
+        if proc is not None and proc.returncode is None:
+            _killpg(proc)  # timeout or cancelled
+            await proc.wait()
+        raise
+
+    finally:
+        times['wall'] = time.time() - start
+        interface._write(rundir, info)
+        for f in (stdout, stderr):
+            if f is not None:
+                f.close()
+
+    return output
+
+
+async def _run_member(xrun, runid, semaphore, timeout=None, callback=None, progress=None, **kwargs):
+    async with semaphore:
+        m = xrun[runid]
+        start = time.time()
+        try:
+            m.output = await arun(m.model.interface, m.rundir, m.params, timeout=timeout, 
+                                  cache=xrun.run_cache, record_start=xrun.store is None, 
+                                  timing=m.timing, **kwargs)
+            m.status = 'success'
+        except Exception as error:
+            end = time.time()
+            xrun._record(runid, m, 'failed', {'start': start, 'end': end, 
+                                              'returncode': getattr(error, 'returncode', None)})
+            if progress is not None:
+                progress.update(runid, 'failed', end - start)
+            return None, "{}:{}".format(type(error).__name__, str(error))
+        end = time.time()
+        xrun._record(runid, m, m.status, {'start': start, 'end': end, 'returncode': 0})
+        if progress is not None:
+            progress.update(runid, m.status, end - start)
+        if callback is not None:
+            callback(m)
+        return m, None
+
+
+def run_ensemble(xrun, indices, max_concurrency, timeout=None, callback=None, progress=None, **kwargs):
+    """Run ensemble members of an XRun instance from one event loop
+
+    At most `max_concurrency` model subprocesses are in flight at any time.
+    `progress` (runner.progress.Progress), if provided, is updated as runs complete.
+
+    Returns a list of `(FrozenModel, None)` or `(None, error message)`,
+    in the order of indices.
+    """
+    async def main():
+        semaphore = asyncio.Semaphore(max_concurrency)
+        return await asyncio.gather(*[
+            _run_member(xrun, i, semaphore, timeout, callback, progress, **kwargs) for i in indices])
+
+    loop = asyncio.new_event_loop()
+    previous = None
+    if sys.version_info < (3, 8):
+        # the child watcher of subprocesses is attached to the current loop
+        try:
+            previous = asyncio.get_event_loop()
+        except RuntimeError:
+            pass  # none in this thread
+        asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(main())
+    finally:
+        if sys.version_info < (3, 8):
+            asyncio.set_event_loop(previous)
+        loop.close()
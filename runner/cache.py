@@ -0,0 +1,143 @@
+"""Content-addressed cache of model runs
+
+A run is identified by a hash of its formatted command, environment, work
+directory, parameters, param file content and the modification time of the
+model executable (and of any script passed as argument), where the run
+directory itself is replaced by a placeholder. If a successful run with the same key is found in the cache,
+its files are hard-linked (or copied) into the new run directory and its
+recorded output is reused, without executing the model.
+
+The cache directory holds one small file per key, which contains the path
+of the run directory that produced it.
+"""
+from __future__ import absolute_import
+import os
+import json
+import shutil
+import hashlib
+import logging
+from runner.tools.misc import which
+
+RUNFILE = 'runner.json'
+
+
+def _normalize(value, rundir):
+    " replace the run directory by a placeholder "
+    return str(value).replace(rundir, '{RUNDIR}')
+
+
+def run_key(args, env, workdir, rundir, params, files=()):
+    """hash (hex digest) for a model run
+
+    * args : [str], command
+    * env : dict of environment variables, or None
+    * workdir : str
+    * rundir : run directory, replaced by a placeholder in all the above
+    * params : dict of parameters
+    * files : paths of input files written by setup (e.g. param file)
+    """
+    env = env or {}
+    record = {
+        'command': [_normalize(a, rundir) for a in args],
+        'env': sorted((k, _normalize(v, rundir)) for k, v in env.items()
+                      if os.environ.get(k) != v),
+        'workdir': _normalize(workdir, rundir),
+        'params': sorted((k, repr(v)) for k, v in params.items()),
+    }
+
+    # executable, and any script passed as argument
+    exe = which(args[0]) if args else None
+    paths = [exe] + [a for a in args[1:] if os.path.isfile(a)] if exe else []
+    record['mtime'] = [(_normalize(p, rundir), os.path.getmtime(p)) for p in paths]
+
+    h = hashlib.sha1(json.dumps(record, sort_keys=True).encode('utf-8'))
+    for path in files:
+        with open(path, 'rb') as f:
+            h.update(_normalize(f.read().decode('utf-8', 'replace'), rundir).encode('utf-8'))
+    return h.hexdigest()
+
+
+def _link_tree(source, dest, exclude=()):
+    " hard-link (or copy) files from source to dest, replacing existing ones "
+    for root, dirs, files in os.walk(source):
+        rel = os.path.relpath(root, source)
+        target = os.path.normpath(os.path.join(dest, rel))
+        if not os.path.exists(target):
+            os.makedirs(target)
+        for name in files:
+            if rel == '.' and name in exclude:
+                continue
+            dst = os.path.join(target, name)
+            if os.path.lexists(dst):
+                os.remove(dst)  # left by an earlier run in that directory
+            src = os.path.join(root, name)
+            try:
+                os.link(src, dst)
+            except OSError:
+                shutil.copy2(src, dst)
+
+
+def unshare(rundir, source):
+    """replace the files of rundir restored (hard-linked) from the cached run
+    in source by private copies, so that re-running the model there leaves 
+    the cached run untouched
+    """
+    for root, dirs, files in os.walk(source):
+        rel = os.path.relpath(root, source)
+        for name in files:
+            path = os.path.normpath(os.path.join(rundir, rel, name))
+            try:
+                if not os.path.samefile(path, os.path.join(root, name)):
+                    continue
+            except OSError:
+                continue  # removed since
+            tmp = path + '.tmp{}'.format(os.getpid())
+            shutil.copy2(path, tmp)
+            os.rename(tmp, path)  # the link is replaced, the source is kept
+
+
+class RunCache(object):
+    """Cache of successful runs, shared across experiments
+    """
+    def __init__(self, cachedir):
+        self.cachedir = cachedir
+
+    def _entry(self, key):
+        return os.path.join(self.cachedir, key)
+
+    def get(self, key):
+        """Return the runner.json record of a successful run with that key, or None
+        """
+        entry = self._entry(key)
+        if not os.path.exists(entry):
+            return None
+        source = open(entry).read().strip()
+        try:
+            info = json.load(open(os.path.join(source, RUNFILE)))
+        except (IOError, OSError, ValueError):
+            return None
+        # the source directory may have been re-used since
+        if info.get('status') != 'success' or info.get('cache_key') != key:
+            return None
+        info['rundir'] = source
+        return info
+
+    def put(self, key, rundir):
+        " register a successful run "
+        if not os.path.exists(self.cachedir):
+            try:
+                os.makedirs(self.cachedir)
+            except OSError:
+                pass  # created meanwhile by another worker
+        entry = self._entry(key)
+        tmp = entry + '.tmp{}'.format(os.getpid())
+        with open(tmp, 'w') as f:
+            f.write(os.path.abspath(rundir))
+        os.rename(tmp, entry)  # atomic
+
+    def restore(self, info, rundir):
+        """Link the files of a cached run into rundir, return its output
+        """
+        logging.info("cached run: {} -> {}".format(info['rundir'], rundir))
+        _link_tree(info['rundir'], rundir, exclude=[RUNFILE])
+        return info.get('output', {})
@@ -60,7 +60,7 @@ def analyze_post(o):
     model = Model(interface.get(orun), likelihood=likelihood)
     paramsfile = os.path.join(o.expdir, XPARAM)
     xparams = XData.read(paramsfile) # for the size & autodir
-    xrun = XRun(model, xparams, expdir=o.expdir, autodir=orun.auto_dir)
+    xrun = XRun(model, xparams, expdir=o.expdir, autodir=orun.auto_dir, cache=True)
 
     xrun.analyze(o.output_variables, anadir=o.out)
 
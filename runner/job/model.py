@@ -115,6 +115,10 @@ grp.add_argument('--env-prefix', default=None,
                  help='prefix for environment variables')
 grp.add_argument('--env-out', default=mod.ENV_OUT,
                  help='environment variable for output (after prefix) (default:%(default)s)')
+grp.add_argument('--batch-command', default=None,
+                 help='multi-run protocol: command called once per batch of runs (see job run --batchsize), \
+                 where `{manifest}` is replaced by a file listing one run directory per line. \
+                 Parameters are passed via --file-in in each run directory.')
 
 custommodel = argparse.ArgumentParser(add_help=False, parents=[])
 grp = custommodel.add_argument_group('user-customed model')
@@ -209,6 +213,7 @@ def getinterface(o):
         filename=o.file_in,
         filetype_output=filetype_out, 
         filename_output=o.file_out,
+        batch_args=o.batch_command,
     )
 
 
@@ -67,9 +67,10 @@ import argparse
 import tempfile
 import numpy as np
 from runner.param import MultiParam, DiscreteParam
-from runner.model import Model
+from runner.model import Model, VectorModelInterface
 #from runner.xparams import XParams
 from runner.xrun import XParams, XRun, XPARAM
+from runner.schedule import RegressionCost
 from runner.job.model import interface
 from runner.job.config import ParserIO, program
 import os
@@ -123,14 +124,40 @@ grp = submit.add_argument_group("simulation modes")
 #grp.add_argument('--batch-script', help='')
 #x = grp.add_mutually_exclusive_group()
 grp.add_argument('--max-workers', type=int, 
-                 help="number of workers for parallel processing (need to be allocated, e.g. via sbatch) -- default to the number of runs")
+                 help="number of workers for parallel processing (need to be allocated, e.g. via sbatch) -- default to the number of CPUs")
+grp.add_argument('--chunksize', type=int, default=1, 
+                 help="number of runs sent at once to a worker, to reduce overhead for short runs (default to %(default)s)")
+grp.add_argument('--batchsize', type=int, default=1, 
+                 help="number of runs per worker task, run back to back or with a single model call \
+                 (see --batch-command), for cheap models (default to %(default)s)")
+grp.add_argument('--engine', choices=['pool', 'asyncio'], default='pool', 
+                 help="pool: one worker process per concurrent run. asyncio: model subprocesses launched from a single event loop, \
+                 for I/O-bound or external models (--max-workers is then the max number of concurrent runs) (default to %(default)s)")
+grp.add_argument('--registry', action='store_true', 
+                 help='record runs in an SQLite registry (registry.db) in the experiment directory, \
+                 instead of the default results.log/results.npz store')
+grp.add_argument('--run-cache', metavar='DIR', 
+                 help='cache directory shared across experiments: runs identical to a previous successful run \
+                 (command, environment, param file, executable) are not executed again, their files are linked instead')
+grp.add_argument('--cost', 
+                 help='expected run cost as a python expression of parameter names, e.g. "res**2*nsteps": \
+                 runs expected to take longest are submitted first')
+grp.add_argument('--cost-from', metavar='EXPDIR', 
+                 help='submit runs expected to take longest first, based on a regression of run time \
+                 on parameters in a previous experiment')
+grp.add_argument('--no-progress', action='store_true', 
+                 help='do not report progress (completed, failed and running runs, throughput, ETA) \
+                 on the terminal and in {expdir}/progress.json')
 grp.add_argument('-t', '--timeout', type=float, default=31536000, help='timeout in seconds (default to %(default)s)')
 grp.add_argument('--shell', action='store_true',
                help='print output to terminal instead of log file, run sequentially, mostly useful for testing/debugging')
 grp.add_argument('--echo', action='store_true', 
                  help='display commands instead of running them (but does setup output directory). Alias for --shell --force echo [model args ...]')
-#grp.add_argument('-b', '--array', action='store_true', 
-#                 help='submit using sbatch --array (faster!), EXPERIMENTAL)')
+grp.add_argument('-b', '--array', action='store_true', 
+                 help='submit the ensemble as a single SLURM job array (sbatch --array), \
+                 and wait for completion')
+grp.add_argument('--array-throttle', type=int, 
+                 help='max number of array tasks running at once (sbatch --array=...%%N)')
 grp.add_argument('-f', '--force', action='store_true', 
                  help='perform run even if params.txt already exists directory')
 
@@ -154,8 +181,8 @@ x.add_argument('-p', '--params',
                  nargs='*')
 x.add_argument('-i','--params-file', help='ensemble parameters file')
 x.add_argument('--continue', dest="continue_simu", action='store_true', 
-                 help=argparse.SUPPRESS)
-                 #help='load params.txt from simulation directory')
+                 help='load params.txt from experiment directory and only run members \
+                 not yet successful (missing, failed or interrupted)')
 
 params_parser.add_argument('-j','--id', type=_typechecker(parse_slurm_array_indices), dest='runid', 
                  metavar="I,J...,START-STOP:STEP,...",
@@ -212,7 +239,13 @@ def main(o):
         xparams = XParams(np.empty((0,0)), names=[])
         o.include_default = True
 
-    xrun = XRun(model, xparams, expdir=o.expdir, autodir=o.auto_dir, max_workers=o.max_workers, timeout=o.timeout)
+    cost = o.cost
+    if o.cost_from:
+        previous = XRun(Model(), XParams.read(os.path.join(o.cost_from, XPARAM)), expdir=o.cost_from)
+        cost = RegressionCost.from_xrun(previous)
+
+    xrun = XRun(model, xparams, expdir=o.expdir, autodir=o.auto_dir, max_workers=o.max_workers, timeout=o.timeout, chunksize=o.chunksize, run_cache=o.run_cache, batchsize=o.batchsize,
+                store='sqlite' if o.registry else True, cost=cost)
     # create dir, write params.txt file, as well as experiment configuration
     try:
         if not o.continue_simu:
@@ -233,6 +266,9 @@ def main(o):
     if o.include_default:
         indices = list(indices) + [None]
 
+    if o.continue_simu:
+        indices = xrun.pending(indices)
+
     # test: run everything serially
     if o.shell:
         
@@ -248,7 +284,7 @@ def main(o):
             info_list = []
 
         for i in indices:
-            xrun[i].run(background=False)
+            xrun._run(i, background=False)
 
             if gen_info:
                 # Add runid and rundir to list for writing 
@@ -263,9 +299,20 @@ def main(o):
             info = pd.DataFrame(info_list,columns=info_header)
             info.to_fwf(exp_file)
             
+    elif o.array:
+        xrun.submit_array(indices=indices, throttle=o.array_throttle, progress=not o.no_progress)
+
+    elif isinstance(model.interface, VectorModelInterface):
+        xrun.run_matrix([i for i in indices if i is not None])
+        if None in list(indices):
+            xrun._run(None)
+
+    elif o.engine == 'asyncio':
+        xrun.run_async(indices=indices, progress=not o.no_progress)
+
     # the default
     else:
-        xrun.run(indices=indices)
+        xrun.run(indices=indices, progress=not o.no_progress)
 
     return
 
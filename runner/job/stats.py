@@ -49,9 +49,12 @@ lhs = argparse.ArgumentParser(add_help=False)
 grp = lhs.add_argument_group("Latin hypercube sampling")
 grp.add_argument('--lhs-criterion', 
                    choices=('center', 'c', 'maximin', 'm', 
-                            'centermaximin', 'cm', 'correlation', 'corr'), 
-                 help='randomized by default')
+                            'centermaximin', 'cm', 'correlation', 'corr',
+                            'ese', 'phip'), 
+                 help='randomized by default. ese (or phip): optimized space-filling design by column exchanges')
 grp.add_argument('--lhs_iterations', type=int)
+grp.add_argument('--lhs-maxtime', type=float, 
+                 help='time budget in seconds for the ese criterion')
 
 
 sample = argparse.ArgumentParser(description="Sample prior parameter distribution", parents=[prior, lhs])
@@ -61,11 +64,11 @@ sample.add_argument('-N', '--size',type=int,
                   help="Sample size")
 sample.add_argument('--seed', type=int, 
                   help="random seed, for reproducible results (default to None)")
-sample.add_argument('--method', choices=['montecarlo','lhs'], default='lhs', 
-                    help="sampling method (default=%(default)s)")
+sample.add_argument('--method', choices=['montecarlo','lhs','lhsmdu','nolh'], default='lhs', 
+                    help="sampling method (default=%(default)s). lhsmdu: latin hypercube with multi-dimensional uniformity. nolh: nearly orthogonal latin hypercube, of fixed size n (17 up to 7 parameters, 33 up to 11...), -N optional, or n + k*(n-1)")
 
 def sample_post(o):
-    if not o.size:
+    if not o.size and o.method != 'nolh':
         sample.error("argument -N/--size is required")
     if not o.dist:
         sample.error("must provide at least one parameter")
@@ -73,7 +76,8 @@ def sample_post(o):
     xparams = prior.sample(o.size, seed=o.seed, 
                            method=o.method,
                            criterion=o.lhs_criterion,
-                           iterations=o.lhs_iterations)
+                           iterations=o.lhs_iterations,
+                           maxtime=o.lhs_maxtime)
     return _return_params(xparams, o.out)
 
 sample = Job(sample, sample_post)
@@ -16,12 +16,20 @@ Copied from https://github.com/tisimst/pyDOE/blob/master/pyDOE/doe_lhs.py
 Commit: 33903b  on Jul 13, 2015
 """
 
+import time
 import numpy as np
 from math import factorial
+from scipy.special import ndtri
 
 __all__ = ['lhs']
 
-def lhs(n, samples=None, criterion=None, iterations=None):
+# number of distances computed at once in _pdist and _mindist
+BLOCK_ELEMENTS = 2**20
+
+# exponent of the phi_p space-filling criterion (ese)
+PHIP_P = 50
+
+def lhs(n, samples=None, criterion=None, iterations=None, maxtime=None):
     """
     Generate a latin-hypercube design
     
@@ -36,11 +44,14 @@ def lhs(n, samples=None, criterion=None, iterations=None):
         The number of samples to generate for each factor (Default: n)
     criterion : str
         Allowable values are "center" or "c", "maximin" or "m", 
-        "centermaximin" or "cm", and "correlation" or "corr". If no value 
-        given, the design is simply randomized.
+        "centermaximin" or "cm", "correlation" or "corr", and "ese" or
+        "phip". If no value given, the design is simply randomized.
     iterations : int
-        The number of iterations in the maximin and correlations algorithms
-        (Default: 5).
+        The number of iterations in the maximin and correlations algorithms,
+        or of outer iterations of the ese algorithm (Default: 5, or no
+        limit for ese if maxtime is given).
+    maxtime : float
+        Time budget in seconds of the ese algorithm (Default: no limit)
     
     Returns
     -------
@@ -90,6 +101,11 @@ def lhs(n, samples=None, criterion=None, iterations=None):
     
         >>> lhs(4, samples=5, criterion='correlate', iterations=10)
     
+    A 5-factor design with 100 samples optimized for the phi_p criterion
+    by column exchanges, within 2 seconds::
+    
+        >>> lhs(5, samples=100, criterion='ese', maxtime=2)
+    
     """
     H = None
     
@@ -98,15 +114,15 @@ def lhs(n, samples=None, criterion=None, iterations=None):
     
     if criterion is not None:
         assert criterion.lower() in ('center', 'c', 'maximin', 'm', 
-            'centermaximin', 'cm', 'correlation', 
-            'corr'), 'Invalid value for "criterion": {}'.format(criterion)
+            'centermaximin', 'cm', 'correlation', 'correlate',
+            'corr', 'ese', 'phip'), 'Invalid value for "criterion": {}'.format(criterion)
     else:
         H = _lhsclassic(n, samples)
 
     if criterion is None:
         criterion = 'center'
     
-    if iterations is None:
+    if iterations is None and not (maxtime and criterion.lower() in ('ese', 'phip')):
         iterations = 5
         
     if H is None:
@@ -116,8 +132,10 @@ def lhs(n, samples=None, criterion=None, iterations=None):
             H = _lhsmaximin(n, samples, iterations, 'maximin')
         elif criterion.lower() in ('centermaximin', 'cm'):
             H = _lhsmaximin(n, samples, iterations, 'centermaximin')
-        elif criterion.lower() in ('correlate', 'corr'):
+        elif criterion.lower() in ('correlation', 'correlate', 'corr'):
             H = _lhscorrelate(n, samples, iterations)
+        elif criterion.lower() in ('ese', 'phip'):
+            H = _lhsese(n, samples, iterations, maxtime)
     
     return H
 
@@ -166,6 +184,7 @@ def _lhscentered(n, samples):
 
 def _lhsmaximin(n, samples, iterations, lhstype):
     maxdist = 0
+    H = None
     
     # Maximize the minimum distance between points
     for i in range(iterations):
@@ -174,33 +193,198 @@ def _lhsmaximin(n, samples, iterations, lhstype):
         else:
             Hcandidate = _lhscentered(n, samples)
         
-        d = _pdist(Hcandidate)
-        if maxdist<np.min(d):
-            maxdist = np.min(d)
-            H = Hcandidate.copy()
+        # only the minimum distance matters: stop as soon as the candidate
+        # cannot beat the current best design
+        d = _mindist(Hcandidate, bound=maxdist)
+        if H is None or maxdist<d:
+            maxdist = d
+            H = Hcandidate
     
     return H
 
 ################################################################################
 
+def _phip_terms(d2, p):
+    " d**-p from squared distances (0 for the diagonal, set to inf) "
+    return d2**(-p/2.)
+
+def _phip(D2, p):
+    " phi_p criterion from the (symmetric) squared distance matrix "
+    return (_phip_terms(D2, p).sum()/2)**(1./p)
+
+def _ese_exchanges(D2, xk, scale, phi, p, i1, i2, ref=None):
+    """
+    phi_p after exchange of xk[i1] and xk[i2], for arrays of candidate pairs
+    (i1, i2), along with rows i1 and i2 of D2 after exchange. Only the pairs
+    that involve i1 or i2 change (the (i1, i2) pair itself does not), so the
+    sum over i<j changes by the change of the sums of rows i1 and i2.
+    
+    ref : magnitude of the sum when phi was last computed from scratch, 
+        which bounds the round-off error of phi**p (default phi**p)
+    """
+    delta = ((xk[i2, None] - xk)**2 - (xk[i1, None] - xk)**2)/scale
+    R1 = D2[i1] + delta
+    R2 = D2[i2] - delta
+    jj = np.arange(len(i1))
+    R1[jj, i1] = R2[jj, i2] = np.inf
+    R1[jj, i2] = R2[jj, i1] = D2[i1, i2]
+    new = _phip_terms(R1, p).sum(axis=1) + _phip_terms(R2, p).sum(axis=1)
+    s = phi**p + new - _phip_terms(D2[i1], p).sum(axis=1) - _phip_terms(D2[i2], p).sum(axis=1)
+    
+    # the sum is dominated by the closest pairs: when an exchange removes
+    # them, the update above cancels out and is recomputed without them
+    for j in np.flatnonzero(s < 1e-6*(phi**p if ref is None else ref)):
+        keep = np.ones(D2.shape[0], dtype=bool)
+        keep[[i1[j], i2[j]]] = False
+        rest = _phip_terms(D2[keep][:, keep], p).sum()/2
+        s[j] = rest + new[j] - _phip_terms(D2[i1[j], i2[j]], p)
+    return np.maximum(s, 0)**(1./p), R1, R2
+
+def _lhsese(n, samples, iterations=None, maxtime=None, p=PHIP_P):
+    """
+    Optimize a random LHS for the phi_p criterion, (sum_{i<j} d_ij^-p)^(1/p),
+    by exchanging two elements of one column at a time, following the
+    enhanced stochastic evolutionary (ESE) algorithm of Jin et al. (2005),
+    "An efficient algorithm for constructing optimal design of computer
+    experiments", J. Stat. Plan. Inference 134.
+    
+    The squared distance matrix is kept up to date, so that the criterion of
+    a candidate exchange costs O(samples). Memory use is O(samples**2).
+    
+    iterations : number of outer iterations (None for no limit)
+    maxtime : time budget in seconds (None for no limit)
+    """
+    H = _lhsclassic(n, samples)
+    m = samples
+    if m < 3:
+        return H
+    start = time.time()
+    
+    # distances are scaled by the initial minimum distance, for d**-p to be 
+    # well within floating point range
+    D2 = np.empty((m, m))
+    for i0, d2 in _sqdist_blocks(H):
+        D2[i0:i0+d2.shape[0]] = d2
+    np.fill_diagonal(D2, np.inf)
+    scale = max(D2.min(), 1e-300)
+    D2 /= scale
+    
+    phi = _phip(D2, p)
+    ref = phi**p
+    Hbest, phibest = H.copy(), phi
+    
+    # number of candidate exchanges per step, of steps per outer iteration
+    ne = m*(m - 1)//2
+    J = min(max(ne//5, 1), 50)
+    M = min(max(2*ne*n//J, 1), 100)
+    T = 0.005*phi
+    
+    it = 0
+    while iterations is None or it < iterations:
+        it += 1
+        phiold = phibest
+        naccept = nimprove = 0
+        for i in range(M):
+            k = i % n
+            xk = H[:, k]
+            # J candidate exchanges at once: rows i1 and i2 of D2 after
+            # exchange of xk[i1] and xk[i2]
+            i1 = np.random.randint(m, size=J)
+            i2 = (i1 + np.random.randint(1, m, size=J)) % m
+            phis, R1, R2 = _ese_exchanges(D2, xk, scale, phi, p, i1, i2, ref)
+            best = np.argmin(phis)
+            phitry, i1, i2, r1, r2 = phis[best], i1[best], i2[best], R1[best], R2[best]
+            
+            if phitry - phi <= T*np.random.rand():
+                xk[i1], xk[i2] = xk[i2], xk[i1]
+                D2[i1], D2[i2] = r1, r2
+                D2[:, i1], D2[:, i2] = r1, r2
+                phi = phitry
+                if phi**p < 1e-6*ref:
+                    # the round-off error of earlier updates would dominate
+                    phi = _phip(D2, p)
+                    ref = phi**p
+                naccept += 1
+                if phi < phibest:
+                    Hbest, phibest = H.copy(), phi
+                    nimprove += 1
+        
+        # limit round-off accumulation
+        phi = _phip(D2, p)
+        ref = phi**p
+        
+        # threshold update: improvement or exploration process
+        ratio = naccept/float(M)
+        if phibest < phiold*(1 - 1e-6):
+            if ratio > 0.1 and nimprove < naccept:
+                T *= 0.8
+            elif ratio <= 0.1:
+                T /= 0.8
+        else:
+            if ratio < 0.1:
+                T /= 0.7
+            elif ratio > 0.8:
+                T *= 0.9
+        
+        if maxtime is not None and time.time() - start >= maxtime:
+            break
+    
+    return Hbest
+
+################################################################################
+
 def _lhscorrelate(n, samples, iterations):
-    mincorr = np.inf
+    """
+    Minimize the correlation between factors (columns) of a random LHS, by 
+    iterated rank restructuring after Iman and Conover (1982), "A
+    distribution-free approach to inducing rank correlation among input
+    variables", Commun. Stat. Simul. Comput. 11.
+    
+    At each iteration, the van der Waerden scores of the design are 
+    decorrelated by the inverse Cholesky factor of their n-by-n correlation 
+    matrix, and each column of the design is re-ordered to follow the ranks 
+    of the decorrelated scores. Cost is O(samples*n**2) per iteration.
+    """
+    H = _lhsclassic(n, samples)
+    if n < 2 or samples < 3:
+        return H
+    
+    best, mincorr = H.copy(), _maxcorr(H)
+    
+    # normal scores of the design's ranks
+    ranks = np.argsort(np.argsort(H, axis=0), axis=0)
+    scores = ndtri((ranks + 1.)/(samples + 1))
+    values = np.sort(H, axis=0)
     
-    # Minimize the components correlation coefficients
     for i in range(iterations):
-        # Generate a random LHS
-        Hcandidate = _lhsclassic(n, samples)
-        R = np.corrcoef(Hcandidate)
-        if np.max(np.abs(R[R!=1]))<mincorr:
-            mincorr = np.max(np.abs(R-np.eye(R.shape[0])))
-            print('new candidate solution found with max,abs corrcoef = {}'.format(mincorr))
-            H = Hcandidate.copy()
+        C = np.corrcoef(scores, rowvar=False)
+        try:
+            L = np.linalg.cholesky(C)
+        except np.linalg.LinAlgError:
+            break  # e.g. fewer samples than factors
+        target = np.linalg.solve(L, scores.T).T
+        
+        # restructure: each column takes the ranks of the target
+        ranks = np.argsort(np.argsort(target, axis=0), axis=0)
+        scores = ndtri((ranks + 1.)/(samples + 1))
+        H = values[ranks, np.arange(n)]
+        
+        corr = _maxcorr(H)
+        if corr < mincorr:
+            best, mincorr = H.copy(), corr
+        else:
+            break  # converged
     
-    return H
+    return best
+
+def _maxcorr(H):
+    " max absolute correlation between two columns of H "
+    R = np.corrcoef(H, rowvar=False)
+    return np.max(np.abs(R - np.eye(R.shape[0])))
     
 ################################################################################
 
-def _pdist(x):
+def _pdist(x, blocksize=None):
     """
     Calculate the pair-wise point distances of a matrix
     
@@ -208,6 +392,9 @@ def _pdist(x):
     ----------
     x : 2d-array
         An m-by-n array of scalars, where there are m points in n dimensions.
+    blocksize : int
+        Number of points processed at once (Default: such that a block holds
+        about BLOCK_ELEMENTS distances)
     
     Returns
     -------
@@ -231,7 +418,7 @@ def _pdist(x):
               
     """
     
-    x = np.atleast_2d(x)
+    x = np.atleast_2d(np.asarray(x, dtype=float))
     assert len(x.shape)==2, 'Input array must be 2d-dimensional'
     
     m, n = x.shape
@@ -239,8 +426,54 @@ def _pdist(x):
         return []
     
     d = []
-    for i in range(m - 1):
-        for j in range(i + 1, m):
-            d.append((sum((x[j, :] - x[i, :])**2))**0.5)
+    for i0, d2 in _sqdist_blocks(x, blocksize):
+        # upper triangle, row by row: pairs (i, j) with j > i
+        d.append(np.sqrt(d2[_upper(i0, d2.shape)]))
+    
+    return np.concatenate(d)
+
+################################################################################
+
+def _sqdist_blocks(x, blocksize=None):
+    """
+    Squared distances between all points of x, by blocks of rows: yield
+    (i0, d2) where d2[k, j] is the squared distance between points i0+k and j.
+    Memory use is O(blocksize*m).
+    """
+    m = x.shape[0]
+    if blocksize is None:
+        blocksize = max(1, BLOCK_ELEMENTS // m)
+    sq = np.einsum('ij,ij->i', x, x)
+    for i0 in range(0, m, blocksize):
+        xb = x[i0:i0+blocksize]
+        d2 = sq[i0:i0+blocksize, None] + sq[None, :] - 2*xb.dot(x.T)
+        np.maximum(d2, 0, out=d2)  # round-off
+        yield i0, d2
+
+def _upper(i0, shape):
+    " mask of pairs (i0+k, j) with j > i0+k in a block "
+    return np.arange(shape[1])[None, :] > np.arange(i0, i0+shape[0])[:, None]
+
+################################################################################
+
+def _mindist(x, bound=None, blocksize=None):
+    """
+    Minimum pair-wise point distance of a matrix, i.e. min(_pdist(x)), 
+    computed block-wise without storing all distances.
     
-    return np.array(d)
+    If bound is provided, return as soon as the running minimum falls
+    below it (the result is then only known to be <= bound).
+    """
+    x = np.atleast_2d(np.asarray(x, dtype=float))
+    m = x.shape[0]
+    if m<2:
+        return np.inf
+    dmin2 = np.inf
+    bound2 = -np.inf if bound is None else bound**2
+    for i0, d2 in _sqdist_blocks(x, blocksize):
+        # exclude self- and already visited pairs (j <= i)
+        d2[~_upper(i0, d2.shape)] = np.inf
+        dmin2 = min(dmin2, d2.min())
+        if dmin2 <= bound2:
+            break
+    return np.sqrt(dmin2)
@@ -5,7 +5,7 @@ Note from the author
 Author: Sahil Moza
 Date: Jan 21, 2016
 
-This is an implementation of Latin Hypercube Sampling with Multi-Dimensional Uniformity (LHS-MDU) from Deutsch and Deutsch, "Latin hypercube sampling with multidimensional uniformity", Journal of Statistical Planning and Inference 142 (2012) , 763-772 
+This is an implementation of Latin Hypercube Sampling with Multi-Dimensional Uniformity (LHS-MDU) from Deutsch and Deutsch, "Latin hypercube sampling with multidimensional uniformity", Journal of Statistical Planning and Inference 142 (2012) , 763-772
 
 ***Currently only for independent variables***
 
@@ -13,116 +13,171 @@ Copied from
 -----------
 https://github.com/sahilm89/lhsmdu/blob/master/lhsmdu/__init__.py
 on Oct 19, 2016 (0e4cd34)
+
+Note M. Perrette: vectorized and without global state (the strata are
+returned, and passed to `resample`). The nearest neighbours of each
+realization are maintained during elimination: only the realizations that
+had the eliminated one among their nearest neighbours are updated, and
+memory is O(realizations).
 """
 
 from __future__ import absolute_import, division, print_function, unicode_literals
-from numpy.linalg import norm
-from numpy import random, matrix, zeros, triu_indices, sum, argsort, ravel, max
-from numpy import min as minimum
-from runner.tools import  rv_continuous, rv_discrete, rv_frozen
+import heapq
+import numpy as np
+from scipy.spatial import cKDTree
 
 ##### Default variables #####
 scalingFactor = 5 ## number > 1 (M) Chosen as 5 as suggested by the paper (above this no improvement.
 numToAverage = 2 ## Number of nearest neighbours to average, as more does not seem to add more information (from paper).
-randomSeed = 42 ## Seed for the random number generator 
-
-
-def createRandomStandardUniformMatrix(nrow, ncol):
-    ''' Creates a matrix with elements drawn from a uniform distribution in [0,1]'''
-    rows = [ [random.random() for i in range(ncol)] for j in range(nrow)]
-    return matrix(rows)
-
-def findUpperTriangularColumnDistanceVector(inputMatrix, ncol):
-    ''' Finds the 1-D upper triangular euclidean distance vector for the columns of a matrix.'''
-    assert ncol == inputMatrix.shape[1]
-    distance_1D = []
-    for i in range(ncol-1):
-        for j in range(i+1,ncol):
-            realization_i, realization_j  = inputMatrix[:,i], inputMatrix[:,j]
-            distance_1D.append(norm(realization_i - realization_j))
-    return distance_1D
-
-def createSymmetricDistanceMatrix(distance, nrow):
-    ''' Creates a symmetric distance matrix from an upper triangular 1D distance vector.'''
-    distMatrix = zeros((nrow,nrow))
-    indices = triu_indices(nrow,k=1)
-    distMatrix[indices] = distance
-    distMatrix[(indices[1], indices[0])] = distance # Making symmetric matrix
-    return distMatrix
-
-def eliminateRealizationsToStrata(distance_1D, matrixOfRealizations, numSamples, numToAverage = numToAverage):
-    ''' Eliminating realizations using average distance measure to give Strata '''
-
-    numDimensions = matrixOfRealizations.shape[0]
-    numRealizations = matrixOfRealizations.shape[1]
-    ## Creating a symmetric IxI distance matrix from the triangular matrix 1D vector.
-    distMatrix = createSymmetricDistanceMatrix(distance_1D, numRealizations)
- 
-    ## Finding columns from the realization matrix by elimination of nearest neighbours L strata are left.
-    averageDistance = {i:0 for i in range(numRealizations)}
-    
-    while(len(averageDistance)>numSamples):
-        for rowNum in sorted(averageDistance.keys()):
-            meanAvgDist = sum( sorted( distMatrix[ rowNum, sorted(averageDistance.keys())])[:numToAverage+1])/numToAverage
-            averageDistance.update( {rowNum: meanAvgDist }) # +1 to remove the zero index, appending averageDistance to list
-        indexToDelete = min(averageDistance, key=averageDistance.get)
-        del averageDistance[indexToDelete]
-    
-    # Creating the strata matrix to draw samples from.
-    StrataMatrix = matrixOfRealizations[:,sorted(averageDistance.keys())]
-
-    assert numSamples == StrataMatrix.shape[1]
-    assert numDimensions == StrataMatrix.shape[0]
-    #print ( StrataMatrix )
-    return StrataMatrix
+randomSeed = 42 ## Seed for the random number generator
+
+
+def _random_state(seed):
+    if isinstance(seed, np.random.RandomState):
+        return seed
+    return np.random.RandomState(seed)
+
+def _average(distances, k):
+    ''' Average distance to the k nearest neighbours (missing ones count as zero,
+    when fewer than k are left)'''
+    d = distances[:, :k]
+    return np.where(np.isfinite(d), d, 0).sum(axis=1)/k
+
+def nearestNeighbours(tree, treeIndices, realizations, rows, alive, numNeighbours):
+    ''' Indices and distances (sorted) of the numNeighbours nearest alive
+    realizations of each of `rows`, itself excluded (realizations as rows of a
+    matrix, tree a KD-tree of realizations[treeIndices]). Missing neighbours
+    have infinite distance.'''
+    k = numNeighbours
+    query = k + 1
+    while True:
+        distances, indices = tree.query(realizations[rows], k=min(query, len(treeIndices)))
+        distances, indices = distances.reshape(len(rows), -1), treeIndices[indices.reshape(len(rows), -1)]
+        valid = alive[indices] & (indices != rows[:, None])
+        if (valid.sum(axis=1) >= k).all() or query >= len(treeIndices):
+            break
+        query *= 2  # eliminated realizations in the way
+
+    # first k valid neighbours, in order of distance
+    order = np.argsort(~valid, axis=1, kind='mergesort')[:, :k]
+    ii = np.arange(len(rows))[:, None]
+    indices, distances, valid = indices[ii, order], distances[ii, order], valid[ii, order]
+    distances[~valid] = np.inf
+    if indices.shape[1] < k:
+        pad = k - indices.shape[1]
+        indices = np.pad(indices, ((0, 0), (0, pad)), 'constant', constant_values=-1)
+        distances = np.pad(distances, ((0, 0), (0, pad)), 'constant', constant_values=np.inf)
+    return indices, distances
+
+def eliminateRealizationsToStrata(matrixOfRealizations, numSamples, numToAverage=numToAverage):
+    ''' Eliminating realizations using average distance measure to give Strata
+
+    matrixOfRealizations : numDimensions x numRealizations
+    Returns the numDimensions x numSamples strata matrix.
+    '''
+    realizations = np.asarray(matrixOfRealizations, dtype=float).T
+    numRealizations = realizations.shape[0]
+    k = numToAverage
+    alive = np.ones(numRealizations, dtype=bool)
+    if numRealizations <= numSamples:
+        alive[numSamples:] = False
+        return realizations[alive].T
+
+    # Realizations are only ever removed, so that the k nearest alive neighbours
+    # are the first k alive ones in a longer list of nearest neighbours: these
+    # need only be searched again when fewer than k remain in the list.
+    numNeighbours = 4*k
+    treeIndices = np.arange(numRealizations)
+    tree = cKDTree(realizations)
+    neighbours, distances = nearestNeighbours(tree, treeIndices, realizations, treeIndices, alive, numNeighbours)
+    averageDistance = _average(distances, k)
+
+    # realizations that have a given one among their nearest neighbours
+    reverse = [set() for i in range(numRealizations)]
+    for i, row in enumerate(neighbours):
+        for j in row:
+            reverse[j].add(i)
+
+    # smallest average distance first (lazy deletion of outdated entries)
+    heap = list(zip(averageDistance.tolist(), range(numRealizations)))
+    heapq.heapify(heap)
+
+    ## Eliminate the realization closest to its neighbours, until L strata are left.
+    numAlive = numRealizations
+    while numAlive > numSamples:
+        dist, indexToDelete = heapq.heappop(heap)
+        if not alive[indexToDelete] or dist != averageDistance[indexToDelete]:
+            continue
+        alive[indexToDelete] = False
+        numAlive -= 1
+        for j in neighbours[indexToDelete]:
+            if j >= 0:
+                reverse[j].discard(indexToDelete)
+        affected = np.array(sorted(reverse[indexToDelete]), dtype=int)
+        reverse[indexToDelete] = set()
+        if not len(affected):
+            continue
+
+        # drop the eliminated neighbour, keeping the lists sorted
+        nn, dist = neighbours[affected], distances[affected]
+        dist[nn == indexToDelete] = np.inf
+        order = np.argsort(dist, axis=1, kind='mergesort')
+        ii = np.arange(len(affected))[:, None]
+        nn, dist = nn[ii, order], dist[ii, order]
+        nn[~np.isfinite(dist)] = -1
+
+        short = ~np.isfinite(dist[:, k-1]) & (numAlive > k)
+        if short.any():
+            if numAlive < len(treeIndices)//2:
+                treeIndices = np.flatnonzero(alive)
+                tree = cKDTree(realizations[treeIndices])
+            nn2, dist2 = nearestNeighbours(tree, treeIndices, realizations, affected[short], alive, numNeighbours)
+            for i, row, row2 in zip(affected[short], nn[short], nn2):
+                for j in row[row >= 0]:
+                    reverse[j].discard(i)
+                for j in row2[row2 >= 0]:
+                    reverse[j].add(i)
+            nn[short], dist[short] = nn2, dist2
+
+        neighbours[affected], distances[affected] = nn, dist
+        averageDistance[affected] = _average(dist, k)
+        for i, d in zip(affected.tolist(), averageDistance[affected].tolist()):
+            heapq.heappush(heap, (d, i))
+
+    return realizations[alive].T
 
 def inverseTransformSample(distribution, uniformSamples):
     ''' This function lets you convert from a standard uniform sample [0,1] to
-    a sample from an arbitrary distribution. This is done by taking the cdf [0,1] of 
+    a sample from an arbitrary distribution. This is done by taking the cdf [0,1] of
     the arbitrary distribution, and calculating its inverse to picking the sample."
     '''
-    assert (isinstance(distribution, rv_continuous) or isinstance(distribution, rv_discrete) or isinstance(distribution,rv_frozen))
-    newSamples = distribution.ppf(uniformSamples)
-    return newSamples
-    
-def resample():
-    ''' Resampling function from the same strata'''
-    numDimensions = matrixOfStrata.shape[0]
-    numSamples = matrixOfStrata.shape[1]
+    return distribution.ppf(uniformSamples)
 
-    matrixOfSamples = []
-    
-    # Creating Matrix of Samples from the strata ordering.
-    for row in range(numDimensions):
-        sortedIndicesOfStrata = argsort(ravel(matrixOfStrata[row,:]))
-    
-        # Generating stratified samples
-        newSamples =  [ (float(x)/numSamples) + (random.random()/numSamples) for x in sortedIndicesOfStrata ]
-        matrixOfSamples.append(newSamples)
-    
-    assert minimum(matrixOfSamples)>=0.
-    assert max(matrixOfSamples)<=1.
-    
-    return matrix(matrixOfSamples)
-
-def sample(numDimensions, numSamples, scalingFactor=scalingFactor, numToAverage = numToAverage, randomSeed=randomSeed ):
-    ''' Main LHS-MDU sampling function '''
-    random.seed(randomSeed) ## Seeding the random number generator.
+def resample(matrixOfStrata, random_state=None):
+    ''' Resampling function from the same strata
 
+    Each sample is drawn uniformly within the interval given by the rank of
+    its stratum, along each dimension. Returns numDimensions x numSamples.
+    '''
+    random_state = _random_state(random_state)
+    matrixOfStrata = np.asarray(matrixOfStrata)
+    numSamples = matrixOfStrata.shape[1]
+    ranks = np.argsort(np.argsort(matrixOfStrata, axis=1), axis=1)
+    return (ranks + random_state.random_sample(ranks.shape))/numSamples
+
+def strata(numDimensions, numSamples, scalingFactor=scalingFactor, numToAverage=numToAverage, random_state=None):
+    ''' Strata matrix (numDimensions x numSamples) from scalingFactor x numSamples realizations '''
+    random_state = _random_state(random_state)
     ### Number of realizations (I) = Number of samples(L) x scale for oversampling (M)
-    numRealizations = scalingFactor*numSamples ## Number of realizations (I)
-    ### Creating NxI realization matrix
-    matrixOfRealizations =  createRandomStandardUniformMatrix(numDimensions, numRealizations)
-    
-    ### Finding distances between column vectors of the matrix to create a distance matrix.
-    distance_1D = findUpperTriangularColumnDistanceVector(matrixOfRealizations, numRealizations)
-    
-    ## Eliminating columns from the realization matrix, using the distance measure  to get a strata
-    ## matrix with number of columns as number of samples requried.
-
-    global matrixOfStrata
-    matrixOfStrata = eliminateRealizationsToStrata(distance_1D, matrixOfRealizations, numSamples)
-
-    matrixOfSamples = resample() 
-    
-    return matrixOfSamples
+    numRealizations = scalingFactor*numSamples
+    matrixOfRealizations = random_state.random_sample((numDimensions, numRealizations))
+    return eliminateRealizationsToStrata(matrixOfRealizations, numSamples, numToAverage)
+
+def sample(numDimensions, numSamples, scalingFactor=scalingFactor, numToAverage=numToAverage, randomSeed=randomSeed):
+    ''' Main LHS-MDU sampling function: numDimensions x numSamples array in [0, 1]
+
+    randomSeed : seed or numpy RandomState (the global random state is not used)
+    '''
+    random_state = _random_state(randomSeed)
+    matrixOfStrata = strata(numDimensions, numSamples, scalingFactor, numToAverage, random_state)
+    return resample(matrixOfStrata, random_state)
@@ -30,10 +30,10 @@ def nolh(conf, remove=None):
 
 
     q = len(conf)
-    m = math.log(q, 2) + 1
-    s = m + (math.factorial(m - 1) / (2 * math.factorial(m - 3)))
-    # Factorial checks if m is an integer
-    m = int(m)
+    m = int(round(math.log(q, 2))) + 1
+    if 2**(m - 1) != q:
+        raise ValueError("configuration length must be a power of 2, got {}".format(q))
+    s = m + math.factorial(m - 1) // (2 * math.factorial(m - 3))
 
     A = numpy.zeros((q, q, m - 1), dtype=int)
     for i in range(1, m):
@@ -76,9 +76,9 @@ def nolh(conf, remove=None):
     
     keep = numpy.ones(s, dtype=bool)
     if remove is not None:
-        keep[numpy.array(remove) - 1] = [False] * len(remove)
+        keep[numpy.array(remove, dtype=int) - 1] = False
     
-    return (numpy.concatenate((T, numpy.zeros((1, s)), -T), axis=0)[:, keep] + 8) / (2.0 * q)
+    return (numpy.concatenate((T, numpy.zeros((1, s)), -T), axis=0)[:, keep] + q) / (2.0 * q)
 
 def params(dim):
     """Returns the NOLH order $m$, the required configuration length $q$
@@ -90,7 +90,7 @@ def params(dim):
     
     while s < dim:
         m += 1
-        s = m + math.factorial(m - 1) / (2 * math.factorial(m - 3))
+        s = m + math.factorial(m - 1) // (2 * math.factorial(m - 3))
         q = 2**(m-1)
 
     return m, q, s - dim
@@ -126,89 +126,89 @@ EA_CONF = {
     17 : ([7, 8, 51, 3, 40, 44, 29, 19, 61, 43, 26, 48, 20, 52, 4, 49, 2,
            57, 31, 30, 24, 23, 56, 50, 18, 59, 63, 37, 38, 21, 54, 9, 46,
            27, 36, 1, 10, 42, 13, 55, 15, 25, 22, 45, 41, 39, 53, 34, 6, 5,
-           2, 58, 16, 28, 64, 14, 47, 33, 12, 35, 62, 17, 11, 60], [8, 11, 12, 14, 17]),
+           32, 58, 16, 28, 64, 14, 47, 33, 12, 35, 62, 17, 11, 60], [8, 11, 12, 14, 17]),
     18 : ([7, 8, 51, 3, 40, 44, 29, 19, 61, 43, 26, 48, 20, 52, 4, 49, 2,
            57, 31, 30, 24, 23, 56, 50, 18, 59, 63, 37, 38, 21, 54, 9, 46,
            27, 36, 1, 10, 42, 13, 55, 15, 25, 22, 45, 41, 39, 53, 34, 6, 5,
-           2, 58, 16, 28, 64, 14, 47, 33, 12, 35, 62, 17, 11, 60], [8, 11, 12, 17]),
+           32, 58, 16, 28, 64, 14, 47, 33, 12, 35, 62, 17, 11, 60], [8, 11, 12, 17]),
     19 : ([7, 8, 51, 3, 40, 44, 29, 19, 61, 43, 26, 48, 20, 52, 4, 49, 2,
            57, 31, 30, 24, 23, 56, 50, 18, 59, 63, 37, 38, 21, 54, 9, 46,
            27, 36, 1, 10, 42, 13, 55, 15, 25, 22, 45, 41, 39, 53, 34, 6, 5,
-           2, 58, 16, 28, 64, 14, 47, 33, 12, 35, 62, 17, 11, 60], [10, 15, 22]),
+           32, 58, 16, 28, 64, 14, 47, 33, 12, 35, 62, 17, 11, 60], [10, 15, 22]),
     20 : ([7, 8, 51, 3, 40, 44, 29, 19, 61, 43, 26, 48, 20, 52, 4, 49, 2,
            57, 31, 30, 24, 23, 56, 50, 18, 59, 63, 37, 38, 21, 54, 9, 46,
            27, 36, 1, 10, 42, 13, 55, 15, 25, 22, 45, 41, 39, 53, 34, 6, 5,
-           2, 58, 16, 28, 64, 14, 47, 33, 12, 35, 62, 17, 11, 60], [8, 12]),
+           32, 58, 16, 28, 64, 14, 47, 33, 12, 35, 62, 17, 11, 60], [8, 12]),
     21 : ([7, 8, 51, 3, 40, 44, 29, 19, 61, 43, 26, 48, 20, 52, 4, 49, 2,
            57, 31, 30, 24, 23, 56, 50, 18, 59, 63, 37, 38, 21, 54, 9, 46,
            27, 36, 1, 10, 42, 13, 55, 15, 25, 22, 45, 41, 39, 53, 34, 6, 5,
-           2, 58, 16, 28, 64, 14, 47, 33, 12, 35, 62, 17, 11, 60], [15]),
+           32, 58, 16, 28, 64, 14, 47, 33, 12, 35, 62, 17, 11, 60], [15]),
     22 : ([7, 8, 51, 3, 40, 44, 29, 19, 61, 43, 26, 48, 20, 52, 4, 49, 2,
            57, 31, 30, 24, 23, 56, 50, 18, 59, 63, 37, 38, 21, 54, 9, 46,
            27, 36, 1, 10, 42, 13, 55, 15, 25, 22, 45, 41, 39, 53, 34, 6, 5,
-           2, 58, 16, 28, 64, 14, 47, 33, 12, 35, 62, 17, 11, 60], []),
+           32, 58, 16, 28, 64, 14, 47, 33, 12, 35, 62, 17, 11, 60], []),
 
     23 : ([9, 108, 39, 107, 62, 86, 110, 119, 46, 43, 103, 71, 123, 91, 10,
            13, 126, 63, 83, 47, 100, 54, 23, 16, 124, 45, 27, 4, 93, 74, 76,
-           90, 30, 81, 77, 53, 116, 49, 104, 6, 70, 82, 26, 118, 55, 79, 32,
+           90, 30, 81, 77, 53, 116, 49, 104, 67, 70, 82, 26, 118, 55, 79, 32,
            109, 57, 31, 22, 101, 44, 87, 121, 7, 37, 56, 89, 115, 25, 92,
            85, 20, 58, 52, 3, 11, 106, 17, 117, 38, 78, 28, 59, 96, 18, 97,
            50, 114, 112, 60, 84, 1, 12, 61, 98, 128, 14, 42, 64, 105, 68,
-           75, 111, 34, 141, 65, 99, 2, 19, 33, 35, 94, 51, 122, 127, 36,
+           75, 111, 34, 41, 65, 99, 2, 19, 33, 35, 94, 51, 122, 127, 36,
            125, 80, 73, 8, 24, 21, 88, 48, 69, 66, 40, 15, 29, 113, 72, 5,
            95, 120, 6, 102], [18, 20, 21, 24, 27, 29]),
     24 : ([9, 108, 39, 107, 62, 86, 110, 119, 46, 43, 103, 71, 123, 91, 10,
            13, 126, 63, 83, 47, 100, 54, 23, 16, 124, 45, 27, 4, 93, 74, 76,
-           90, 30, 81, 77, 53, 116, 49, 104, 6, 70, 82, 26, 118, 55, 79, 32,
+           90, 30, 81, 77, 53, 116, 49, 104, 67, 70, 82, 26, 118, 55, 79, 32,
            109, 57, 31, 22, 101, 44, 87, 121, 7, 37, 56, 89, 115, 25, 92,
            85, 20, 58, 52, 3, 11, 106, 17, 117, 38, 78, 28, 59, 96, 18, 97,
            50, 114, 112, 60, 84, 1, 12, 61, 98, 128, 14, 42, 64, 105, 68,
-           75, 111, 34, 141, 65, 99, 2, 19, 33, 35, 94, 51, 122, 127, 36,
+           75, 111, 34, 41, 65, 99, 2, 19, 33, 35, 94, 51, 122, 127, 36,
            125, 80, 73, 8, 24, 21, 88, 48, 69, 66, 40, 15, 29, 113, 72, 5,
            95, 120, 6, 102], [4, 15, 18, 24, 27]),
     25 : ([9, 108, 39, 107, 62, 86, 110, 119, 46, 43, 103, 71, 123, 91, 10,
            13, 126, 63, 83, 47, 100, 54, 23, 16, 124, 45, 27, 4, 93, 74, 76,
-           90, 30, 81, 77, 53, 116, 49, 104, 6, 70, 82, 26, 118, 55, 79, 32,
+           90, 30, 81, 77, 53, 116, 49, 104, 67, 70, 82, 26, 118, 55, 79, 32,
            109, 57, 31, 22, 101, 44, 87, 121, 7, 37, 56, 89, 115, 25, 92,
            85, 20, 58, 52, 3, 11, 106, 17, 117, 38, 78, 28, 59, 96, 18, 97,
            50, 114, 112, 60, 84, 1, 12, 61, 98, 128, 14, 42, 64, 105, 68,
-           75, 111, 34, 141, 65, 99, 2, 19, 33, 35, 94, 51, 122, 127, 36,
+           75, 111, 34, 41, 65, 99, 2, 19, 33, 35, 94, 51, 122, 127, 36,
            125, 80, 73, 8, 24, 21, 88, 48, 69, 66, 40, 15, 29, 113, 72, 5,
            95, 120, 6, 102], [21, 26, 27, 29]),
     26 : ([9, 108, 39, 107, 62, 86, 110, 119, 46, 43, 103, 71, 123, 91, 10,
            13, 126, 63, 83, 47, 100, 54, 23, 16, 124, 45, 27, 4, 93, 74, 76,
-           90, 30, 81, 77, 53, 116, 49, 104, 6, 70, 82, 26, 118, 55, 79, 32,
+           90, 30, 81, 77, 53, 116, 49, 104, 67, 70, 82, 26, 118, 55, 79, 32,
            109, 57, 31, 22, 101, 44, 87, 121, 7, 37, 56, 89, 115, 25, 92,
            85, 20, 58, 52, 3, 11, 106, 17, 117, 38, 78, 28, 59, 96, 18, 97,
            50, 114, 112, 60, 84, 1, 12, 61, 98, 128, 14, 42, 64, 105, 68,
-           75, 111, 34, 141, 65, 99, 2, 19, 33, 35, 94, 51, 122, 127, 36,
+           75, 111, 34, 41, 65, 99, 2, 19, 33, 35, 94, 51, 122, 127, 36,
            125, 80, 73, 8, 24, 21, 88, 48, 69, 66, 40, 15, 29, 113, 72, 5,
            95, 120, 6, 102], [26, 27, 29]),
     27 : ([9, 108, 39, 107, 62, 86, 110, 119, 46, 43, 103, 71, 123, 91, 10,
            13, 126, 63, 83, 47, 100, 54, 23, 16, 124, 45, 27, 4, 93, 74, 76,
-           90, 30, 81, 77, 53, 116, 49, 104, 6, 70, 82, 26, 118, 55, 79, 32,
+           90, 30, 81, 77, 53, 116, 49, 104, 67, 70, 82, 26, 118, 55, 79, 32,
            109, 57, 31, 22, 101, 44, 87, 121, 7, 37, 56, 89, 115, 25, 92,
            85, 20, 58, 52, 3, 11, 106, 17, 117, 38, 78, 28, 59, 96, 18, 97,
            50, 114, 112, 60, 84, 1, 12, 61, 98, 128, 14, 42, 64, 105, 68,
-           75, 111, 34, 141, 65, 99, 2, 19, 33, 35, 94, 51, 122, 127, 36,
+           75, 111, 34, 41, 65, 99, 2, 19, 33, 35, 94, 51, 122, 127, 36,
            125, 80, 73, 8, 24, 21, 88, 48, 69, 66, 40, 15, 29, 113, 72, 5,
            95, 120, 6, 102], [27, 29]),
     28 : ([9, 108, 39, 107, 62, 86, 110, 119, 46, 43, 103, 71, 123, 91, 10,
            13, 126, 63, 83, 47, 100, 54, 23, 16, 124, 45, 27, 4, 93, 74, 76,
-           90, 30, 81, 77, 53, 116, 49, 104, 6, 70, 82, 26, 118, 55, 79, 32,
+           90, 30, 81, 77, 53, 116, 49, 104, 67, 70, 82, 26, 118, 55, 79, 32,
            109, 57, 31, 22, 101, 44, 87, 121, 7, 37, 56, 89, 115, 25, 92,
            85, 20, 58, 52, 3, 11, 106, 17, 117, 38, 78, 28, 59, 96, 18, 97,
            50, 114, 112, 60, 84, 1, 12, 61, 98, 128, 14, 42, 64, 105, 68,
-           75, 111, 34, 141, 65, 99, 2, 19, 33, 35, 94, 51, 122, 127, 36,
+           75, 111, 34, 41, 65, 99, 2, 19, 33, 35, 94, 51, 122, 127, 36,
            125, 80, 73, 8, 24, 21, 88, 48, 69, 66, 40, 15, 29, 113, 72, 5,
            95, 120, 6, 102], [20]),
     29 : ([9, 108, 39, 107, 62, 86, 110, 119, 46, 43, 103, 71, 123, 91, 10,
            13, 126, 63, 83, 47, 100, 54, 23, 16, 124, 45, 27, 4, 93, 74, 76,
-           90, 30, 81, 77, 53, 116, 49, 104, 6, 70, 82, 26, 118, 55, 79, 32,
+           90, 30, 81, 77, 53, 116, 49, 104, 67, 70, 82, 26, 118, 55, 79, 32,
            109, 57, 31, 22, 101, 44, 87, 121, 7, 37, 56, 89, 115, 25, 92,
            85, 20, 58, 52, 3, 11, 106, 17, 117, 38, 78, 28, 59, 96, 18, 97,
            50, 114, 112, 60, 84, 1, 12, 61, 98, 128, 14, 42, 64, 105, 68,
-           75, 111, 34, 141, 65, 99, 2, 19, 33, 35, 94, 51, 122, 127, 36,
+           75, 111, 34, 41, 65, 99, 2, 19, 33, 35, 94, 51, 122, 127, 36,
            125, 80, 73, 8, 24, 21, 88, 48, 69, 66, 40, 15, 29, 113, 72, 5,
            95, 120, 6, 102], [])
 }
@@ -217,6 +217,25 @@ CONF = dict()
 CONF.update(C_CONF)
 CONF.update(EA_CONF)
 
+# designs already built, by dimension
+_DESIGNS = {}
+
+def design(dim):
+    """Returns the NOLH of dimensionality *dim* from the configurations above,
+    as a read-only array of shape (2q + 1, dim) in $[0, 1]$. The design is
+    built once per dimension.
+    """
+    if dim not in _DESIGNS:
+        if dim == 1:
+            H = design(2)[:, :1]
+        elif dim in CONF:
+            H = nolh(*CONF[dim])
+        else:
+            raise ValueError("no NOLH configuration for {} dimensions (max {})".format(dim, max(CONF)))
+        H.setflags(write=False)
+        _DESIGNS[dim] = H
+    return _DESIGNS[dim]
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description=("Compute a Nearly "
         "Orthogonal Latin hypercube from a configuration vector."))
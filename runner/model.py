@@ -1,17 +1,23 @@
 from __future__ import print_function, absolute_import
 import subprocess
 import os
+import signal
+import errno
+import time
 import logging
 import sys
+import multiprocessing
 import json, pickle
 import datetime
 from collections import OrderedDict as odict, namedtuple
 import six
+import numpy as np
 from argparse import Namespace
 from runner import __version__
 from runner.filetype import FileType
 from runner.param import Param, MultiParam
 from runner.tools import parse_val
+from runner.cache import run_key, unshare
 #from runner.model.generic import get_or_make_filetype
 
 # default values
@@ -21,6 +27,103 @@ ENV_OUT = "RUNDIR"
 ParamIO = namedtuple("ParamIO", ["name","value"])
 
 
+def _killpg(proc):
+    " kill the model and any child process it started "
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:
+        pass  # already terminated
+
+
+def _wait(proc, timeout):
+    if six.PY3:
+        try:
+            return proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            raise multiprocessing.TimeoutError(str(timeout))
+    deadline = time.time() + timeout
+    while proc.poll() is None:
+        if time.time() > deadline:
+            raise multiprocessing.TimeoutError(str(timeout))
+        time.sleep(0.1)
+    return proc.returncode
+
+
+def _wait4(proc, timeout=None):
+    """wait for the process, return its returncode and resource usage
+    (os.wait4, None if not available)
+    """
+    if not hasattr(os, 'wait4'):
+        return (proc.wait() if timeout is None else _wait(proc, timeout)), None
+
+    # poll with a short sleep: no extra thread per run, and little latency
+    deadline = None if timeout is None else time.time() + timeout
+    delay = 0.0005
+    while True:
+        try:
+            pid, status, rusage = os.wait4(proc.pid, 0 if deadline is None else os.WNOHANG)
+        except OSError as error:
+            if error.errno == errno.EINTR:
+                continue
+            raise
+        if pid:
+            break
+        if time.time() > deadline:
+            raise multiprocessing.TimeoutError(str(timeout))
+        time.sleep(delay)
+        delay = min(2*delay, 0.005)
+
+    if os.WIFSIGNALED(status):
+        proc.returncode = -os.WTERMSIG(status)
+    else:
+        proc.returncode = os.WEXITSTATUS(status)
+    return proc.returncode, rusage
+
+
+def _call(args, timeout=None, **kwargs):
+    """like subprocess.call, but with a timeout after which the command and
+    any process it started (its process group) are killed
+
+    Returns returncode, resource usage of the command (or None)
+    """
+    if timeout is not None:
+        if six.PY3:
+            kwargs['start_new_session'] = True
+        else:
+            kwargs['preexec_fn'] = os.setsid
+
+    proc = subprocess.Popen(args, **kwargs)
+    try:
+        return _wait4(proc, timeout)
+    except BaseException:
+        # timeout, or worker interrupted
+        if timeout is None:
+            proc.kill()
+        else:
+            _killpg(proc)
+        proc.wait()
+        raise
+
+
+def _usage(rusage):
+    " child CPU time (s) and max resident set size (KB) "
+    if rusage is None:
+        return {}
+    maxrss = rusage.ru_maxrss / 1024. if sys.platform == 'darwin' else float(rusage.ru_maxrss)
+    return {'cpu': rusage.ru_utime + rusage.ru_stime, 'maxrss': maxrss}
+
+
+def _env_diff(env):
+    " environment variables set or modified with respect to os.environ "
+    if env is None:
+        return None
+    return {k: v for k, v in env.items() if os.environ.get(k) != v}
+
+
+def _error_message(error):
+    return "{}:{}".format(type(error).__name__, str(error))
+
+
 class ModelInterface(object):
     def __init__(self, args=None, 
                  filetype=None, filename=None, 
@@ -29,6 +132,7 @@ class ModelInterface(object):
                  work_dir=None, 
                  filetype_output=None, filename_output=None,
                  defaults=None,
+                 batch_args=None,
                  ):
         """
         * args : [str] or str
@@ -54,6 +158,11 @@ class ModelInterface(object):
         * filename_output : relative path to rundir, optional
             filename for output variable (also needs filetype_output)
         * defaults : dict, optional, default parameters
+        * batch_args : [str] or str, optional
+            Multi-run protocol: command called once for a batch of runs (see
+            `run_batch`), where the `{manifest}` tag is replaced by a file 
+            listing one run directory per line. The model must read its 
+            parameters from the param file (`filename`) of each run directory.
         """
         if isinstance(args, six.string_types):
             args = args.split()
@@ -68,6 +177,9 @@ class ModelInterface(object):
         self.env_out = env_out
         self.work_dir = work_dir or os.getcwd() 
         self.defaults = defaults or {}
+        if isinstance(batch_args, six.string_types):
+            batch_args = batch_args.split()
+        self.batch_args = batch_args
 
         # check !
         if filename:
@@ -155,7 +267,7 @@ class ModelInterface(object):
         else:
             runfile = self.runfile(rundir)
 
-        if update:
+        if update and os.path.exists(runfile):
             updateinfo = runinfo
             runinfo = json.load(open(runfile))
             runinfo.update(updateinfo)
@@ -165,10 +277,13 @@ class ModelInterface(object):
         runinfo['version'] = __version__
         runinfo['rundir'] = rundir
 
-        with open(runfile, 'w') as f:
+        # write to a temporary file and rename: readers never see a partial record
+        tmp = runfile + '.tmp{}'.format(os.getpid())
+        with open(tmp, 'w') as f:
             json.dump(runinfo, f, 
                       indent=2, 
                       default=lambda x: x.tolist() if hasattr(x, 'tolist') else x)
+        os.rename(tmp, runfile)
 
     def setup(self, rundir, params):
         """Write param file to run directory (assumed already created)
@@ -186,34 +301,27 @@ class ModelInterface(object):
         """return model output as dictionary or None
         """
         if not self.filename_output:
-            info = json.load(open(self.runfile(rundir)))
+            # output written by the model itself, if any
+            runfile = self.runfile(rundir)
+            if not os.path.exists(runfile):
+                return {}
+            info = json.load(open(runfile))
             return info.pop("output", {})
 
         assert self.filetype_output, "filetype_output is required"
         return self.filetype_output.load(open(os.path.join(rundir, self.filename_output)))
 
 
-    def run(self, rundir, params, background=True, shell=False):
-        """Run the model
-
-        Arguments:
-
-        * rundir : run directory
-        * params : dict of parameters (will be updated with default params)
-        * background : if False, no log file will be created
-        * shell : passed to subprocess
-
-        Steps:
+    def _prepare(self, rundir, params, record_start=True):
+        """create run directory, write runner.json (if record_start) and setup the model
 
-        - create directory if not existing
-        - setup() : write param file if needed
-        - call subprocess or submit to SLURM
-        - postprocess() : read output
-        - write runner.json
+        Returns args, workdir, env and info, the run record to be completed
         """
         # create run directory
         if not os.path.exists(rundir):
             os.makedirs(rundir)
+        else:
+            self._unshare(rundir)
 
         params_kw = odict(self.defaults)
         params_kw.update(params)
@@ -226,32 +334,117 @@ class ModelInterface(object):
         info = odict()
         info['command'] = " ".join(args)
         info['workdir'] = workdir
-        info['env'] = env
+        info['env'] = _env_diff(env)
         info['params'] = params_kw
         info['status'] = 'running'
-        self._write(rundir, info)
+        if record_start:
+            self._write(rundir, info)
 
         self.setup(rundir, params_kw)
 
-        #print("Hello after setup.") 
+        return args, workdir, env, info
 
-        if background:
-            output = os.path.join(rundir, 'log.out')
-            error = os.path.join(rundir, 'log.err')
-            stdout = open(output, 'a+')
-            stderr = open(error, 'a+')
-        else:
-            stdout = None
-            stderr = None
+    def _unshare(self, rundir):
+        " copy files linked from a cached run, if the last run was restored "
+        runfile = self.runfile(rundir)
+        if not os.path.exists(runfile):
+            return
+        try:
+            source = json.load(open(runfile)).get('cached_from')
+        except ValueError:
+            return
+        if source and os.path.isdir(source):
+            unshare(rundir, source)
+
+    def _logfiles(self, rundir, background=True):
+        " stdout and stderr files (None if not background) "
+        if not background:
+            return None, None
+        return (open(os.path.join(rundir, 'log.out'), 'a+'),
+                open(os.path.join(rundir, 'log.err'), 'a+'))
+
+
+    def _cache_key(self, rundir, args, env, workdir, info):
+        files = [os.path.join(rundir, self.filename)] if self.filename else []
+        return run_key(args, env, workdir, rundir, info['params'], files)
+
+    def _restore(self, rundir, cache, key, info):
+        """reuse a cached run if any, return output or None
+        """
+        cached = cache.get(key)
+        if cached is None:
+            return None
+        info['status'] = 'success'
+        info['output'] = output = cache.restore(cached, rundir)
+        info['cache_key'] = key
+        info['cached_from'] = cached['rundir']
+        self._write(rundir, info)
+        return output
+
+    def run(self, rundir, params, background=True, shell=False, timeout=None, cache=None, record_start=True, timing=None):
+        """Run the model
+
+        Arguments:
+
+        * rundir : run directory
+        * params : dict of parameters (will be updated with default params)
+        * background : if False, no log file will be created
+        * shell : passed to subprocess
+        * timeout : if provided, the model runs in its own process group, 
+            which is killed after `timeout` seconds (multiprocessing.TimeoutError)
+        * cache : runner.cache.RunCache instance, optional
+            if an identical run (command, environment, param file, executable)
+            already succeeded, reuse its files and output instead of running
+        * record_start : if False, runner.json is only written once the run 
+            is over (e.g. status tracked in a central store), instead of 
+            before and after
+        * timing : dict, optional, updated with the run timings (also 
+            recorded in runner.json): wall, setup, run and postprocess time, 
+            child CPU time (s) and max resident set size (KB) of the model
+
+        Steps:
+
+        - create directory if not existing
+        - setup() : write param file if needed
+        - call subprocess or submit to SLURM
+        - postprocess() : read output
+        - write runner.json
+        """
+        start = time.time()
+        args, workdir, env, info = self._prepare(rundir, params, record_start)
+        info['timing'] = times = odict()
+        times['setup'] = time.time() - start
+
+        if cache is not None:
+            key = self._cache_key(rundir, args, env, workdir, info)
+            times['wall'] = time.time() - start
+            output = self._restore(rundir, cache, key, info)
+            if output is not None:
+                if timing is not None:
+                    timing.update(times)
+                return output
+
+        stdout, stderr = self._logfiles(rundir, background)
 
         # wait for execution and postprocess
         try:
             if shell:
                 args = " ".join(args)
-            subprocess.check_call(args, env=env, cwd=workdir, 
-                                  stdout=stdout, stderr=stderr, shell=shell)
+            t0 = time.time()
+            returncode, rusage = _call(args, timeout, env=env, cwd=workdir, 
+                                       stdout=stdout, stderr=stderr, shell=shell)
+            times['run'] = time.time() - t0
+            times.update(_usage(rusage))
+            info['returncode'] = returncode
+            if returncode:
+                raise subprocess.CalledProcessError(returncode, args)
             info['status'] = 'success'
+            t0 = time.time()
             info['output'] = output = self.postprocess(rundir)
+            times['postprocess'] = time.time() - t0
+            if cache is not None:
+                info['cache_key'] = key
+                cache.put(key, rundir)
 
         except OSError as error:
             info['status'] = 'failed'
@@ -262,11 +455,126 @@ class ModelInterface(object):
             raise
 
         finally:
+            times['wall'] = time.time() - start
+            if timing is not None:
+                timing.update(times)
             self._write(rundir, info)
+            for f in (stdout, stderr):
+                if f is not None:
+                    f.close()
 
         return output
 
 
+    def run_batch(self, rundirs, params_list, background=True, timeout=None, cache=None, record_start=True, timings=None):
+        """Run several members back to back, or with a single call of the 
+        model if `batch_args` is provided (multi-run protocol)
+
+        In the latter case, the manifest and log files are written in the 
+        first run directory of the batch, and `timeout` applies to the whole 
+        batch. Model time and resources are then shared equally among members.
+
+        * timings : list of dict, optional, one per member, see `run`
+
+        Returns a list of `(output, None)` or `(None, error message)`, in order.
+        """
+        if timings is None:
+            timings = [{} for _ in rundirs]
+
+        batch_args = getattr(self, 'batch_args', None)  # older pickled interfaces
+        if not batch_args:
+            results = []
+            for rundir, params, timing in zip(rundirs, params_list, timings):
+                try:
+                    results.append((self.run(rundir, params, background=background, timeout=timeout, 
+                                             cache=cache, record_start=record_start, timing=timing), None))
+                except Exception as error:
+                    results.append((None, _error_message(error)))
+            return results
+
+        results = [None]*len(rundirs)
+        todo = []  # index, rundir, info, cache key
+        for k, (rundir, params) in enumerate(zip(rundirs, params_list)):
+            key = None
+            try:
+                start = time.time()
+                args, workdir, env, info = self._prepare(rundir, params, record_start)
+                info['timing'] = timings[k]
+                timings[k]['setup'] = timings[k]['wall'] = time.time() - start
+                if cache is not None:
+                    key = self._cache_key(rundir, args, env, workdir, info)
+                    output = self._restore(rundir, cache, key, info)
+                    if output is not None:
+                        results[k] = output, None
+                        continue
+            except Exception as error:
+                results[k] = None, _error_message(error)
+                continue
+            todo.append((k, rundir, info, key))
+
+        if not todo:
+            return results
+
+        first = todo[0][1]
+        manifest = os.path.join(first, 'batch.manifest')
+        with open(manifest, 'w') as f:
+            f.write("".join(rundir+'\n' for _, rundir, _, _ in todo))
+        args = [arg.format(manifest=manifest) for arg in batch_args]
+        workdir = self.workdir(first)
+        if background:
+            stdout = open(os.path.join(first, 'batch.out'), 'a+')
+            stderr = open(os.path.join(first, 'batch.err'), 'a+')
+        else:
+            stdout = stderr = None
+
+        t0 = time.time()
+        rusage = None
+        try:
+            returncode, rusage = _call(args, timeout, cwd=workdir, stdout=stdout, stderr=stderr)
+            if returncode:
+                raise subprocess.CalledProcessError(returncode, args)
+            error = None
+        except OSError:
+            error = "OSError:FAILED TO EXECUTE: `"+" ".join(args)+"` FROM `"+workdir+"`"
+        except Exception as e:
+            error = _error_message(e)
+        finally:
+            for f in (stdout, stderr):
+                if f is not None:
+                    f.close()
+
+        n = len(todo)
+        shared = {'run': (time.time() - t0) / n}
+        usage = _usage(rusage)
+        if usage:
+            shared['cpu'] = usage['cpu'] / n
+            shared['maxrss'] = usage['maxrss']  # peak of the batch
+
+        for k, rundir, info, key in todo:
+            times = info['timing']
+            times.update(shared)
+            if error is None:
+                try:
+                    t0 = time.time()
+                    info['output'] = output = self.postprocess(rundir)
+                    times['postprocess'] = time.time() - t0
+                    info['status'] = 'success'
+                    if cache is not None:
+                        info['cache_key'] = key
+                        cache.put(key, rundir)
+                    results[k] = output, None
+                except Exception as e:
+                    info['status'] = 'failed'
+                    results[k] = None, _error_message(e)
+            else:
+                info['status'] = 'failed'
+                results[k] = None, error
+            times['wall'] = times['setup'] + times['run'] + times.get('postprocess', 0)
+            self._write(rundir, info)
+
+        return results
+
+
     def __call__(self, rundir, params):
         """freeze run directory and parameters
         """
@@ -274,6 +582,115 @@ class ModelInterface(object):
         return model(rundir, params)
 
 
+class PythonModelInterface(ModelInterface):
+    """Model as a python callable `func(params) -> dict`, called in-process
+
+    No subprocess is started: in an ensemble, the function is called directly
+    in the worker processes, and its output is returned with the pool result
+    and recorded in the result store (see XRun `store`).
+    """
+    def __init__(self, func, defaults=None, write_rundir=False):
+        """
+        * func : callable, dict of parameters -> dict of output variables
+            needs to be pickable (e.g. defined at module level) for use with
+            worker processes
+        * defaults : dict, optional, default parameters
+        * write_rundir : if True, also create the run directory and write 
+            runner.json as for command-line models (False by default)
+
+        Note: `timeout` and run `cache` do not apply to in-process models.
+        """
+        super(PythonModelInterface, self).__init__(defaults=defaults)
+        self.func = func
+        self.write_rundir = write_rundir
+
+    def command(self, rundir, params):
+        return [getattr(self.func, '__name__', repr(self.func))]
+
+    def _call_func(self, params, timing=None):
+        " call func, update timing with wall and (process) cpu time "
+        start, cpu = time.time(), os.times()
+        try:
+            return dict(self.func(params) or {})
+        finally:
+            if timing is not None:
+                end = os.times()
+                timing['wall'] = timing['run'] = time.time() - start
+                timing['cpu'] = (end[0] - cpu[0]) + (end[1] - cpu[1])
+
+    def run(self, rundir, params, background=True, shell=False, timeout=None, cache=None, record_start=True, timing=None):
+        """Call the function, return its output
+        """
+        params_kw = odict(self.defaults)
+        params_kw.update(params)
+
+        if not self.write_rundir:
+            return self._call_func(params_kw, timing)
+
+        if not os.path.exists(rundir):
+            os.makedirs(rundir)
+        info = odict()
+        info['command'] = " ".join(self.command(rundir, params_kw))
+        info['params'] = params_kw
+        info['timing'] = times = odict()
+        try:
+            info['output'] = output = self._call_func(params_kw, times)
+            info['status'] = 'success'
+        except:
+            info['status'] = 'failed'
+            raise
+        finally:
+            if timing is not None:
+                timing.update(times)
+            self._write(rundir, info)
+        return output
+
+
+class VectorModelInterface(PythonModelInterface):
+    """Vectorized model: `func(xparams) -> output matrix`, for a whole chunk of
+    the ensemble at once (e.g. emulators)
+
+    `func` receives an XParams instance (`values` of shape (N, p) and `names`)
+    and returns an XData-like object (`values` of shape (N, k) and `names`),
+    or an array of shape (N, k) whose columns are `output_names`.
+    See `XRun.run_matrix`.
+    """
+    def __init__(self, func, output_names=None, defaults=None, chunksize=100000):
+        """
+        * func : callable, see above
+        * output_names : [str], required if func returns a plain array
+        * defaults : dict, optional, default parameters
+        * chunksize : max number of ensemble members passed at once to func
+        """
+        super(VectorModelInterface, self).__init__(func, defaults=defaults)
+        self.output_names = output_names
+        self.chunksize = chunksize
+
+    def evaluate(self, values, names):
+        """evaluate func on a parameter matrix (with default params appended)
+
+        Returns output names, output values as (N, k) array
+        """
+        from runner.xparams import XParams
+        extra = [k for k in self.defaults if k not in names]
+        if extra:
+            values = np.column_stack([values] + [np.repeat(self.defaults[k], len(values)) for k in extra])
+            names = list(names) + extra
+        res = self.func(XParams(values, list(names)))
+        if hasattr(res, 'names'):
+            return list(res.names), np.asarray(res.values, dtype=float)
+        if self.output_names is None:
+            raise ValueError("output_names is required if func does not return names")
+        return list(self.output_names), np.asarray(res, dtype=float).reshape(len(values), -1)
+
+    def run(self, rundir, params, background=True, shell=False, timeout=None, cache=None, record_start=True, timing=None):
+        """Evaluate a single member
+        """
+        names = list(params.keys())
+        onames, ovalues = self.evaluate(np.array([[params[k] for k in names]], dtype=float), names)
+        return dict(zip(onames, ovalues[0]))
+
+
 class Model(object):
     """Bayesian model, where prior represents information about the parameters, 
     and posterior about output variables.
@@ -352,6 +769,7 @@ class FrozenModel(object):
         self.params = params
         self.output = output or {}
         self.status = None
+        self.timing = {}
 
     @property
     def prior(self):
@@ -382,6 +800,7 @@ class FrozenModel(object):
         self.params = cfg["params"]
         self.output = cfg.pop("output",{})
         self.status = cfg.pop("status", None)
+        self.timing = cfg.pop("timing", None) or {}
         return self
 
     def save(self, file=None):
@@ -392,11 +811,24 @@ class FrozenModel(object):
         }, update=True)
 
 
-    def run(self, background=True, shell=False):
+    def run(self, background=True, shell=False, timeout=None, cache=None, record_start=True, timing=None):
         """Run the model
+
+        * timing : dict, optional, filled with run timings (see ModelInterface.run)
         """
-        self.output = self.model.interface.run(self.rundir, self.params, background=background, shell=shell)
+        kwargs = {}
+        if timeout is not None:
+            kwargs['timeout'] = timeout
+        if cache is not None:
+            kwargs['cache'] = cache
+        if not record_start:
+            kwargs['record_start'] = False
+        if timing is not None:
+            kwargs['timing'] = timing
+        self.output = self.model.interface.run(self.rundir, self.params, background=background, shell=shell, **kwargs)
         self.status = "success"
+        if timing is not None:
+            self.timing = timing
         return self
 
 
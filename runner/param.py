@@ -11,6 +11,8 @@ import numpy as np
 import runner.xparams as xp
 from runner.xparams import XParams
 from runner.lib.doelhs import lhs
+from runner.lib import lhsmdu
+from runner.lib import pynolh
 from runner.tools.dist import parse_val, DiscreteDist, cost
 from runner.tools.dist import parse_dist2, dist_to_str2, dist_todict2, dist_fromkw2
 
@@ -35,10 +37,22 @@ class Param(object):
         self.default = default
         self.help = help
         self.full_name = full_name
+        self._intervals = {}  # cache: alpha -> (dist, interval)
 
     def __call__(self, value=None):
         return FrozenParam(self, value)
 
+    def interval(self, alpha=ALPHA):
+        """confidence interval of the distribution, computed once per alpha
+        """
+        if self.dist is None:
+            return -np.inf, np.inf
+        cached = self._intervals.get(alpha)
+        if cached is None or cached[0] is not self.dist:
+            cached = self.dist, tuple(self.dist.interval(alpha))
+            self._intervals[alpha] = cached
+        return cached[1]
+
     def __str__(self):
         #return "{name}={value}".format(name=self.name, value=self.value)
         if self.dist:
@@ -80,7 +94,7 @@ class Param(object):
 
 
     def as_dict(self):
-        kw = self.__dict__.copy()
+        kw = {k:v for k,v in self.__dict__.items() if not k.startswith('_')}
         dist = kw.pop('dist')
         kw2 = dist_todict2(dist)
         for k in kw2:
@@ -133,7 +147,7 @@ class FrozenParam(object):
     def isvalid(self, alpha=ALPHA):
         """params in the confidence interval
         """
-        lo, hi = self.dist.interval(alpha)
+        lo, hi = self.param.interval(alpha)
         if not np.isfinite(self.value) or self.value < lo or self.value > hi:
             return False
         else:
@@ -212,12 +226,14 @@ class MultiParam(ParamList):
         return XParams(pmatrix, self.names)
 
 
-    def sample_lhs(self, size, seed=None, criterion=LHS_CRITERION, iterations=None):
+    def sample_lhs(self, size, seed=None, criterion=LHS_CRITERION, iterations=None, maxtime=None):
         """Latin hypercube sampling --> return Xparams
+
+        * maxtime : time budget in seconds (ese criterion)
         """
         pmatrix = np.empty((size,len(self.names)))
         np.random.seed(seed)
-        lhd = lhs(len(self.names), size, criterion, iterations) # sample x parameters, all in [0, 1]
+        lhd = lhs(len(self.names), size, criterion, iterations, maxtime) # sample x parameters, all in [0, 1]
 
         for i, p in enumerate(self):
             pmatrix[:,i] = p.dist.ppf(lhd[:,i]) # take the quantile for the particular distribution
@@ -225,13 +241,64 @@ class MultiParam(ParamList):
         return XParams(pmatrix, self.names)
 
 
+    def sample_lhsmdu(self, size, seed=None, scaling=lhsmdu.scalingFactor):
+        """Latin hypercube sampling with multi-dimensional uniformity --> return Xparams
+
+        * scaling : number of candidate realizations per sample
+        """
+        pmatrix = np.empty((size,len(self.names)))
+        lhd = lhsmdu.sample(len(self.names), size, scaling, randomSeed=seed).T # all in [0, 1]
+
+        for i, p in enumerate(self):
+            pmatrix[:,i] = p.dist.ppf(lhd[:,i])
+
+        return XParams(pmatrix, self.names)
+
+
+    def sample_nolh(self, size=None, seed=None):
+        """Nearly orthogonal latin hypercube --> return Xparams
+
+        The design has a fixed number of points n for a given number of
+        parameters (17 up to 7 parameters, 33 up to 11, ...). Larger sizes
+        must be n + k*(n-1): k copies of the design with randomly permuted
+        columns (seed) and without their centre point are added, their levels
+        interleaved with the first one's so that the result is still latin.
+        """
+        design = pynolh.design(len(self.names))
+        n = design.shape[0]
+        size = size or n
+        if size < n or (size - n) % (n-1):
+            raise ValueError("nolh design for {} parameters has {} points: size must be {} + k*{}, got {}".format(len(self.names), n, n, n-1, size))
+        m = 1 + (size - n)//(n-1)  # number of copies
+        levels = np.rint(design*(n-1)).astype(int)
+        centre = (n-1)//2
+        rng = np.random.RandomState(seed)
+        blocks = [levels*m]
+        for k in range(1, m):
+            copy = levels[:, rng.permutation(len(self.names))]
+            copy = copy[(copy != centre).any(axis=1)]
+            # shift towards the centre by k/m of a level, in between copy 0 
+            blocks.append(np.where(copy < centre, copy*m + k, copy*m - k))
+        lhd = (np.concatenate(blocks) + 0.5)/size  # levels -> interval centres in ]0, 1[
+
+        pmatrix = np.empty((size,len(self.names)))
+        for i, p in enumerate(self):
+            pmatrix[:,i] = p.dist.ppf(lhd[:,i])
+
+        return XParams(pmatrix, self.names)
+
+
     def sample(self, size, seed=None, method="lhs", **kwargs):
         """Wrapper for the various sampling methods. Unused **kwargs are ignored.
         """
-        pmatrix = np.empty((size,len(self.names)))
         if method == "lhs":
-            opts = filterkeys(kwargs, ['criterion', 'iterations'])
+            opts = filterkeys(kwargs, ['criterion', 'iterations', 'maxtime'])
             xparams = self.sample_lhs(size, seed, **opts)
+        elif method == "lhsmdu":
+            opts = filterkeys(kwargs, ['scaling'])
+            xparams = self.sample_lhsmdu(size, seed, **opts)
+        elif method == "nolh":
+            xparams = self.sample_nolh(size, seed)
         else:
             xparams = self.sample_montecarlo(size, seed)
         return xparams
@@ -239,6 +306,32 @@ class MultiParam(ParamList):
     def __call__(self, **kw):
         return FrozenParams([p(kw.pop(p.name, p.default)) for p in self])
 
+    def logpdf_matrix(self, values):
+        """log-pdf for a whole ensemble, one distribution call per param
+
+        * values : array-like of shape (size, len(self)), columns in params order
+
+        Returns array of same shape (nan where values are nan)
+        """
+        values = np.asarray(values, dtype=float)
+        res = np.empty_like(values)
+        for j, p in enumerate(self):
+            if p.dist is None:
+                res[:, j] = np.where(np.isnan(values[:, j]), np.nan, 0.)
+            else:
+                res[:, j] = p.dist.logpdf(values[:, j])
+        return res
+
+    def isvalid_matrix(self, values, alpha=ALPHA):
+        """values in the confidence interval for a whole ensemble (see `logpdf_matrix`)
+
+        Returns boolean array of same shape as values
+        """
+        values = np.asarray(values, dtype=float)
+        valid = np.isfinite(values)
+        lo, hi = np.array([p.interval(alpha) for p in self]).reshape(len(self), 2).T
+        return valid & (values >= lo) & (values <= hi)
+
 
     def asdict(self, key=None):
         return {key:[p.as_dict() for p in self]}
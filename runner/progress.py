@@ -0,0 +1,130 @@
+"""Progress of an ensemble run
+
+Fed with completion events, reports counts, throughput, ETA and run duration
+percentiles on the terminal, and in a status file `progress.json` in the
+experiment directory, rewritten at most every few seconds, e.g. for
+dashboards to poll.
+"""
+from __future__ import absolute_import, division
+import os
+import sys
+import json
+import time
+import logging
+import numpy as np
+
+PROGRESS = 'progress.json'
+
+
+def _fmt_seconds(seconds):
+    if seconds is None or not np.isfinite(seconds):
+        return '?'
+    seconds = int(round(seconds))
+    h, rest = divmod(seconds, 3600)
+    m, s = divmod(rest, 60)
+    return '{}:{:02d}:{:02d}'.format(h, m, s) if h else '{}:{:02d}'.format(m, s)
+
+
+class Progress(object):
+    """Track completed and failed runs of an ensemble
+    """
+    def __init__(self, total, expdir=None, concurrency=1, interval=2., stream=None):
+        """
+        * total : number of runs
+        * expdir : if provided, write status to expdir/progress.json
+        * concurrency : number of runs in flight at once (workers)
+        * interval : min number of seconds between two reports
+        * stream : terminal stream, default to sys.stderr if a terminal,
+            otherwise a log line is emitted instead at each report
+        """
+        self.total = total
+        self.expdir = expdir
+        self.concurrency = concurrency
+        self.interval = interval
+        self.stream = stream
+        self.completed = 0
+        self.failed = 0
+        self.durations = []
+        self.start = time.time()
+        self._last = None
+        self._width = 0
+
+    @property
+    def statusfile(self):
+        return os.path.join(self.expdir, PROGRESS)
+
+    def update(self, runid, status, duration=None):
+        """one run finished
+
+        * status : "success" or "failed"
+        * duration : run duration in seconds, if known
+        """
+        if status == 'success':
+            self.completed += 1
+        else:
+            self.failed += 1
+        if duration is not None:
+            self.durations.append(duration)
+        if self._last is None or time.time() - self._last >= self.interval:
+            self.report()
+
+    def status(self):
+        " current status as dict "
+        now = time.time()
+        elapsed = now - self.start
+        done = self.completed + self.failed
+        rate = done / elapsed if elapsed > 0 else 0.
+        remaining = self.total - done
+        if self.durations:
+            p50, p95 = np.percentile(self.durations, [50, 95]).tolist()
+        else:
+            p50 = p95 = None
+        return {
+            'total': self.total,
+            'completed': self.completed,
+            'failed': self.failed,
+            'running': min(self.concurrency, remaining),
+            'pending': max(remaining - self.concurrency, 0),
+            'elapsed': elapsed,
+            'rate': rate,
+            'eta': remaining / rate if rate > 0 else None,
+            'duration_p50': p50,
+            'duration_p95': p95,
+            'time': now,
+        }
+
+    def message(self, status=None):
+        s = status or self.status()
+        msg = '{completed}/{total} completed, {failed} failed, {running} running, {rate:.2f} runs/s'.format(**s)
+        msg += ', ETA '+_fmt_seconds(s['eta'])
+        if s['duration_p50'] is not None:
+            msg += ', run duration p50 {:.2f}s p95 {:.2f}s'.format(s['duration_p50'], s['duration_p95'])
+        return msg
+
+    def report(self, final=False):
+        " write status file and terminal line "
+        self._last = time.time()
+        status = self.status()
+        if self.expdir is not None:
+            status['done'] = final
+            tmp = self.statusfile + '.tmp{}'.format(os.getpid())
+            try:
+                with open(tmp, 'w') as f:
+                    json.dump(status, f, indent=2)
+                os.rename(tmp, self.statusfile)
+            except (IOError, OSError) as error:
+                logging.warn("failed to write progress: "+str(error))
+
+        stream = self.stream
+        if stream is None and sys.stderr.isatty():
+            stream = sys.stderr
+        if stream is not None:
+            msg = self.message(status)
+            self._width = max(self._width, len(msg))
+            stream.write('\r'+msg.ljust(self._width)+('\n' if final else ''))
+            stream.flush()
+        else:
+            logging.info(self.message(status))
+
+    def close(self):
+        self.report(final=True)
@@ -0,0 +1,171 @@
+"""SQLite registry of ensemble runs
+
+Alternative to the files-based result store (runner.store), with the same
+protocol, in a single `registry.db` database in the experiment directory.
+Also records start and end times and return code of each run, and answers
+simple queries (e.g. number of successful runs) with indexed lookups.
+
+The database is in WAL mode, so that workers may record runs concurrently
+while the ensemble is being read.
+"""
+from __future__ import absolute_import
+import os
+import sqlite3
+import numpy as np
+from runner.store import GROUPS, _scalar, _resize
+
+REGISTRY = 'registry.db'
+
+# run metadata, besides status
+INFO = ['start', 'end', 'returncode']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    runid INTEGER PRIMARY KEY,
+    status TEXT,
+    start REAL,
+    end REAL,
+    returncode INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_status ON runs (status);
+CREATE TABLE IF NOT EXISTS vals (
+    runid INTEGER,
+    grp TEXT,
+    name TEXT,
+    value REAL,
+    PRIMARY KEY (runid, grp, name)
+);
+"""
+
+
+class RunRegistry(object):
+    """Ensemble-level record of run status, times, params and output
+    """
+    def __init__(self, expdir, timeout=60):
+        """
+        * expdir : experiment directory
+        * timeout : seconds to wait for a lock held by another writer
+        """
+        self.expdir = expdir
+        self.timeout = timeout
+        self._conn = None
+        self._pid = None
+
+    def __getstate__(self):
+        # connections are per process
+        state = self.__dict__.copy()
+        state['_conn'] = None
+        state['_pid'] = None
+        return state
+
+    @property
+    def dbfile(self):
+        return os.path.join(self.expdir, REGISTRY)
+
+    def exists(self):
+        return os.path.exists(self.dbfile)
+
+    def connect(self):
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.dbfile, timeout=self.timeout)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def close(self):
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+
+    def clear(self):
+        self.close()
+        for f in self.dbfile, self.dbfile+'-wal', self.dbfile+'-shm':
+            if os.path.exists(f):
+                os.remove(f)
+
+    def append(self, runid, status, **groups):
+        """Record one run, e.g. append(3, 'success', params={..}, output={..},
+        info={'start': .., 'end': .., 'returncode': 0})
+        """
+        self.extend([(runid, status, groups)])
+
+    def extend(self, records):
+        """Record several `(runid, status, groups)` in one transaction
+        """
+        runs = []
+        vals = []
+        for runid, status, groups in records:
+            info = groups.get('info') or {}
+            runs.append((int(runid), status) + tuple(info.get(k) for k in INFO))
+            for name in GROUPS:
+                for k, v in (groups.get(name) or {}).items():
+                    vals.append((int(runid), name, k, _scalar(v)))
+        self._write(runs, vals)
+
+    def update(self, runids, status, **groups):
+        """Record many runs at once, in columnar form (see ResultStore.update)
+        """
+        runids = [int(i) for i in np.asarray(runids)]
+        status = np.broadcast_to(np.asarray(status), (len(runids),))
+        runs = [(i, str(s), None, None, None) for i, s in zip(runids, status)]
+        vals = []
+        for name in GROUPS:
+            names, values = groups.get(name) or ([], np.empty((len(runids), 0)))
+            for j, k in enumerate(names):
+                vals.extend((i, name, k, float(v)) for i, v in zip(runids, values[:, j]))
+        self._write(runs, vals)
+
+    def _write(self, runs, vals):
+        if not runs:
+            return
+        conn = self.connect()
+        with conn:  # one transaction: last record wins
+            conn.executemany('DELETE FROM vals WHERE runid = ?', [(r[0],) for r in runs])
+            conn.executemany('INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?)', runs)
+            conn.executemany('INSERT INTO vals VALUES (?, ?, ?, ?)', vals)
+
+    def count(self, status='success'):
+        " number of runs with that status (indexed lookup) "
+        return self.connect().execute(
+            'SELECT COUNT(*) FROM runs WHERE status = ?', (status,)).fetchone()[0]
+
+    def runids(self, status='success'):
+        " run ids with that status "
+        return [r[0] for r in self.connect().execute(
+            'SELECT runid FROM runs WHERE status = ? ORDER BY runid', (status,))]
+
+    def load(self, size=0):
+        """Load the ensemble (see ResultStore.load)
+
+        Returns status, columns where status is an array of str ('' for runs
+        never recorded) and columns a dict of `(names, values)` pairs for
+        `params`, `output` and `info` (start, end, returncode).
+        """
+        conn = self.connect()
+        runs = conn.execute('SELECT runid, status, start, end, returncode FROM runs').fetchall()
+        n = max([size] + [r[0]+1 for r in runs])
+
+        status = np.zeros(n, dtype='U16')
+        info = np.empty((n, len(INFO)))
+        info.fill(np.nan)
+        if runs:
+            runids = np.array([r[0] for r in runs])
+            status[runids] = [r[1] for r in runs]
+            info[runids] = [[np.nan if v is None else v for v in r[2:]] for r in runs]
+        columns = {'info': (list(INFO), info)}
+
+        for name in GROUPS:
+            rows = conn.execute('SELECT runid, name, value FROM vals WHERE grp = ?', (name,)).fetchall()
+            names = sorted(set(r[1] for r in rows))
+            index = {k: j for j, k in enumerate(names)}
+            values = np.empty((n, len(names)))
+            values.fill(np.nan)
+            if rows:
+                values[[r[0] for r in rows], [index[r[1]] for r in rows]] = [
+                    np.nan if r[2] is None else r[2] for r in rows]
+            columns[name] = names, values
+
+        status = _resize(status, size, '')
+        return status, columns
@@ -0,0 +1,108 @@
+"""Cost-aware scheduling of ensemble members
+
+Runs predicted to be the longest are submitted first (longest processing time
+first), so that a few slow stragglers do not dominate the end of the ensemble.
+The cost is predicted from the parameters, either by a user expression or by
+a regression on the timings of a previous experiment.
+"""
+from __future__ import absolute_import, division
+import six
+import numpy as np
+
+
+class CostModel(object):
+    """Predict relative run cost from parameters
+    """
+    def predict(self, values, names):
+        """cost of each row of the (N, p) parameter matrix, as array of N floats
+        """
+        raise NotImplementedError()
+
+
+class ExpressionCost(CostModel):
+    """Cost as a python expression of parameter names, e.g. "res**2 * nt"
+
+    Evaluated on whole columns, with numpy functions available as `np` and
+    directly (exp, log, sqrt...).
+    """
+    def __init__(self, expr):
+        self.expr = expr
+
+    def predict(self, values, names):
+        context = {k: getattr(np, k) for k in dir(np) if not k.startswith('_')}
+        context['np'] = np
+        context.update({name: values[:, j] for j, name in enumerate(names)})
+        cost = eval(self.expr, {'__builtins__': {}}, context)
+        return np.broadcast_to(np.asarray(cost, dtype=float), (values.shape[0],))
+
+
+class FunctionCost(CostModel):
+    """Cost from a callable `func(values, names)`
+    """
+    def __init__(self, func):
+        self.func = func
+
+    def predict(self, values, names):
+        return np.asarray(self.func(values, names), dtype=float)
+
+
+class RegressionCost(CostModel):
+    """Log-linear regression of run time on parameters:
+    log(wall) = a + sum(b_i * param_i)
+    """
+    def __init__(self, names, coefs):
+        self.names = list(names)
+        self.coefs = np.asarray(coefs)
+
+    @classmethod
+    def fit(cls, values, names, wall):
+        """Fit on previous runs
+
+        * values : (N, p) parameter matrix
+        * names : parameter names
+        * wall : (N,) run times (nan for runs to be ignored)
+        """
+        values = np.asarray(values, dtype=float)
+        wall = np.asarray(wall, dtype=float)
+        ok = np.isfinite(wall) & (wall > 0) & np.isfinite(values).all(axis=1)
+        if ok.sum() < 2:
+            raise ValueError("not enough timed runs to fit a cost model")
+        A = np.column_stack([np.ones(ok.sum()), values[ok]])
+        coefs = np.linalg.lstsq(A, np.log(wall[ok]), rcond=None)[0]
+        return cls(names, coefs)
+
+    @classmethod
+    def from_xrun(cls, xrun):
+        " fit on the timings of an experiment (XRun instance) "
+        timings = xrun.get_timings(['wall'])
+        return cls.fit(np.asarray(xrun.params.values), xrun.params.names, timings.values[:, 0])
+
+    def predict(self, values, names):
+        # parameters unknown to the model are ignored
+        A = np.zeros((values.shape[0], len(self.names)))
+        for j, name in enumerate(self.names):
+            if name in names:
+                A[:, j] = values[:, list(names).index(name)]
+        return np.exp(self.coefs[0] + A.dot(self.coefs[1:]))
+
+
+def get_cost_model(cost):
+    """CostModel from an expression (str), a callable `f(values, names)` or
+    a CostModel instance
+    """
+    if cost is None or isinstance(cost, CostModel):
+        return cost
+    if isinstance(cost, six.string_types):
+        return ExpressionCost(cost)
+    if callable(cost):
+        return FunctionCost(cost)
+    raise TypeError("invalid cost model: "+repr(cost))
+
+
+def order_by_cost(indices, costs):
+    """indices sorted by decreasing cost (stable, nan last)
+    """
+    costs = np.asarray(costs, dtype=float)
+    key = np.where(np.isnan(costs), -np.inf, costs)
+    order = np.argsort(-key, kind='mergesort')
+    return [indices[k] for k in order]
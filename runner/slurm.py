@@ -0,0 +1,182 @@
+"""Submit an ensemble as a single SLURM job array
+
+One job script is written to the experiment directory, along with the pickled
+XRun instance, and submitted once with `sbatch --array=IDS%N`, where each
+array task runs the ensemble member `$SLURM_ARRAY_TASK_ID`. Completion is
+tracked from the result store (or runner.json files) of the experiment,
+instead of polling the scheduler for each job.
+
+Array task entry point:
+
+    python -m runner.slurm EXPDIR/xrun.pickle RUNID
+"""
+from __future__ import print_function, absolute_import
+import os
+import sys
+import time
+import pickle
+import subprocess
+from runner.submit import Slurm, SlurmJobTracker
+
+XRUN_PICKLE = 'xrun.pickle'
+JOBFILE = 'array.sh'
+SUBMITTED = 'submitted'
+
+
+def format_array_indices(indices):
+    """sbatch --array syntax for a list of indices, e.g. [0,1,2,5,7,8] -> "0-2,5,7-8"
+    (inverse of runner.job.run.parse_slurm_array_indices)
+    """
+    indices = sorted(set(int(i) for i in indices))
+    ranges = []
+    for i in indices:
+        if ranges and i == ranges[-1][1] + 1:
+            ranges[-1][1] = i
+        else:
+            ranges.append([i, i])
+    return ",".join(str(a) if a == b else "{}-{}".format(a, b) for a, b in ranges)
+
+
+class SlurmArray(object):
+    """Ensemble members submitted as one SLURM job array
+    """
+    def __init__(self, xrun, indices, throttle=None, logdir=None, **opt):
+        """
+        * xrun : XRun instance
+        * indices : ensemble members to run
+        * throttle : max number of array tasks running at once (`%N`)
+        * logdir : directory for the tasks' stdout/stderr, default to expdir/slurm
+        * **opt : other sbatch options, e.g. time="01:00:00", mem="2G"
+        """
+        self.xrun = xrun
+        self.indices = [int(i) for i in indices]
+        self.throttle = throttle
+        self.logdir = logdir or os.path.join(xrun.expdir, 'slurm')
+        self.opt = opt
+        self.jobid = None
+
+    @property
+    def jobfile(self):
+        return os.path.join(self.xrun.expdir, JOBFILE)
+
+    @property
+    def array(self):
+        spec = format_array_indices(self.indices)
+        if self.throttle:
+            spec += '%{}'.format(self.throttle)
+        return spec
+
+    def write(self):
+        """write pickled XRun and job script, return the job script
+        """
+        if not os.path.exists(self.logdir):
+            os.makedirs(self.logdir)
+
+        pfile = os.path.join(self.xrun.expdir, XRUN_PICKLE)
+        with open(pfile, 'wb') as f:
+            pickle.dump(self.xrun, f)
+
+        opt = {'array': self.array,
+               'output': os.path.join(self.logdir, '%A_%a.out'),
+               'error': os.path.join(self.logdir, '%A_%a.err')}
+        opt.update(self.opt)
+        commands = [
+            'cd '+os.getcwd(),
+            '{} -m runner.slurm {} $SLURM_ARRAY_TASK_ID'.format(sys.executable, pfile),
+        ]
+        job = Slurm(commands, **opt)
+        with open(self.jobfile, 'w') as f:
+            f.write(job.script)
+        return job
+
+    def submit(self):
+        """write and submit the job array, return job id
+        """
+        job = self.write()
+        self._mark_submitted()
+        self.jobid = job.submit(self.jobfile).jobid
+        print("Submitted job array {}: {} runs".format(self.jobid, len(self.indices)))
+        return self.jobid
+
+    def _mark_submitted(self):
+        """record the members as 'submitted', so that the status of an earlier
+        attempt (e.g. failed, before resubmission) is not taken as final
+        """
+        xrun = self.xrun
+        if xrun.store is not None:
+            xrun.store.extend([(i, SUBMITTED, {}) for i in self.indices])
+            return
+        interface = xrun.model.interface
+        for i in self.indices:
+            rundir = xrun.get_rundir(i)
+            if os.path.exists(interface.runfile(rundir)):
+                interface._write(rundir, {'status': SUBMITTED}, update=True)
+
+    def status(self):
+        """status of the array members, from the experiment's result store
+        or runner.json files ('' if not finished yet)
+        """
+        self.xrun.clear_cache()
+        status = self.xrun._load_results().status
+        return [status[i] if status[i] in ('success', 'failed') else '' for i in self.indices]
+
+    def wait(self, poll=10, timeout=None, progress=None):
+        """wait for all members to complete, return the number of successful runs
+
+        * poll : seconds between two reads of the result store
+        * timeout : give up after that many seconds (multiprocessing.TimeoutError)
+        * progress : runner.progress.Progress instance, optional
+
+        The scheduler is also queried (one sacct call per poll), so that
+        tasks killed before recording their status (e.g. time limit) are
+        counted as failed once the whole array is over.
+        """
+        import multiprocessing
+        tracker = SlurmJobTracker([self.jobid]) if self.jobid else None
+        start = time.time()
+        done = set()
+        while True:
+            over = self._array_over(tracker)
+            status = self.status()
+            if over:
+                status = [s or 'failed' for s in status]
+            for i, s in zip(self.indices, status):
+                if s and i not in done:
+                    done.add(i)
+                    if progress is not None:
+                        progress.update(i, s)
+            if len(done) == len(self.indices):
+                break
+            if timeout is not None and time.time() - start > timeout:
+                raise multiprocessing.TimeoutError(str(timeout))
+            time.sleep(poll)
+        if progress is not None:
+            progress.close()
+        return status.count('success')
+
+    def _array_over(self, tracker):
+        " True if the scheduler reports the whole array as finished "
+        if tracker is None:
+            return False
+        try:
+            tracker.poll()
+        except (OSError, subprocess.CalledProcessError):
+            return False  # no accounting available: rely on the store only
+        return tracker.done(self.jobid)
+
+
+def main(argv=None):
+    " run one ensemble member, as an array task "
+    pfile, runid = (argv or sys.argv[1:])[:2]
+    with open(pfile, 'rb') as f:
+        xrun = pickle.load(f)
+    try:
+        xrun._run(int(runid))
+    except Exception as error:
+        print("run {} failed: {}:{}".format(runid, type(error).__name__, str(error)), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
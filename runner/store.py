@@ -0,0 +1,234 @@
+"""Columnar store of ensemble results
+
+Status, params and scalar output of all runs of an experiment are collected in
+the experiment directory, so that the ensemble can be analyzed without opening
+every run's `runner.json`.
+
+Each finished run is appended as one json line to `results.log`. On load, the
+log is compacted into the columnar `results.npz` archive, along with the
+number of log bytes it already accounts for, so that subsequent loads only
+parse what was appended in the meantime.
+"""
+from __future__ import absolute_import
+import os
+import json
+import logging
+import numpy as np
+
+STORE_LOG = 'results.log'
+STORE_NPZ = 'results.npz'
+
+# record groups (columns of scalars)
+GROUPS = ['params', 'output', 'timing']
+
+
+def _scalar(value):
+    " reduce value to float: mean for arrays, nan if not numeric "
+    try:
+        return float(np.mean(value)) if np.ndim(value) else float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def dicts_as_matrix(dicts, names=None):
+    """Stack a list of {name: value} dicts into a float matrix
+
+    Missing values are nan. Names not provided are collected from the dicts,
+    in order of appearance.
+
+    Returns names, values
+    """
+    if names is None:
+        names = []
+        seen = set()
+        for d in dicts:
+            for k in d:
+                if k not in seen:
+                    seen.add(k)
+                    names.append(k)
+    values = np.empty((len(dicts), len(names)))
+    values.fill(np.nan)
+    for i, d in enumerate(dicts):
+        values[i] = [_scalar(d[k]) if k in d else np.nan for k in names]
+    return names, values
+
+
+def merge_columns(names, values, newnames, newvalues, rows):
+    """insert `newvalues` at `rows` in `values`, extending columns if needed
+    """
+    names = list(names)
+    extra = [k for k in newnames if k not in names]
+    if extra:
+        pad = np.empty((values.shape[0], len(extra)))
+        pad.fill(np.nan)
+        values = np.concatenate((values, pad), axis=1)
+        names.extend(extra)
+    cols = [names.index(k) for k in newnames]
+    values[rows] = np.nan
+    values[np.asarray(rows)[:, None], np.asarray(cols, dtype=int)[None, :]] = newvalues
+    return names, values
+
+
+def _resize(values, size, fill):
+    if values.shape[0] >= size:
+        return values
+    pad = np.empty((size - values.shape[0],)+values.shape[1:], dtype=values.dtype)
+    pad.fill(fill)
+    return np.concatenate((values, pad), axis=0)
+
+
+class ResultStore(object):
+    """Ensemble-level record of run status, params and output
+    """
+    def __init__(self, expdir):
+        self.expdir = expdir
+
+    @property
+    def logfile(self):
+        return os.path.join(self.expdir, STORE_LOG)
+
+    @property
+    def npzfile(self):
+        return os.path.join(self.expdir, STORE_NPZ)
+
+    def exists(self):
+        return os.path.exists(self.logfile) or os.path.exists(self.npzfile)
+
+    def clear(self):
+        for f in self.logfile, self.npzfile:
+            if os.path.exists(f):
+                os.remove(f)
+
+    def append(self, runid, status, **groups):
+        """Append one run record, e.g. append(3, 'success', params={..}, output={..})
+
+        The record is written with a single `write` call on a file opened in
+        append mode, so that workers may append concurrently as runs finish.
+        """
+        self.extend([(runid, status, groups)])
+
+    def extend(self, records):
+        """Append several `(runid, status, groups)` records in one write
+        """
+        lines = []
+        for runid, status, groups in records:
+            record = {'runid': int(runid), 'status': status}
+            for name in GROUPS:
+                record[name] = {k: _scalar(v) for k, v in (groups.get(name) or {}).items()}
+            lines.append(json.dumps(record) + '\n')
+        if not lines:
+            return
+        fd = os.open(self.logfile, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, "".join(lines).encode('utf-8'))
+        finally:
+            os.close(fd)
+
+    def _read_npz(self):
+        with np.load(self.npzfile) as data:
+            columns = {name: (data[name+'_names'].tolist(), data[name]) if name+'_names' in data
+                       else ([], np.empty((data['status'].size, 0))) for name in GROUPS}
+            return int(data['offset']), data['status'], columns
+
+    def _write_npz(self, offset, status, columns):
+        arrays = {'offset': offset, 'status': status}
+        for name in GROUPS:
+            names, values = columns[name]
+            arrays[name+'_names'] = np.array(names, dtype=str)
+            arrays[name] = values
+        tmp = self.npzfile + '.tmp{}.npz'.format(os.getpid())
+        np.savez(tmp, **arrays)
+        os.rename(tmp, self.npzfile)  # atomic
+
+    def _read_log(self, offset):
+        """parse complete lines appended after offset, return records and new offset
+        """
+        if not os.path.exists(self.logfile):
+            return [], offset
+        with open(self.logfile, 'rb') as f:
+            f.seek(offset)
+            content = f.read()
+        end = content.rfind(b'\n') + 1  # ignore a line being written
+        records = []
+        for line in content[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line.decode('utf-8')))
+            except ValueError:
+                logging.warn("skip malformed record in {}: {!r}".format(self.logfile, line[:80]))
+        return records, offset + end
+
+    def _compact(self):
+        """merge the log into the columnar archive, return offset, status, columns
+        """
+        if os.path.exists(self.npzfile):
+            offset, status, columns = self._read_npz()
+        else:
+            offset = 0
+            status = np.zeros(0, dtype='U16')
+            columns = {name: ([], np.empty((0, 0))) for name in GROUPS}
+
+        records, newoffset = self._read_log(offset)
+
+        if records:
+            # last record wins
+            runids = np.array([r['runid'] for r in records])
+            _, last = np.unique(runids[::-1], return_index=True)
+            keep = np.sort(len(runids) - 1 - last)
+            records = [records[k] for k in keep]
+            runids = runids[keep]
+
+            n = max(status.size, runids.max()+1)
+            status = _resize(status, n, '')
+            status[runids] = [r['status'] for r in records]
+            for name in GROUPS:
+                names, values = columns[name]
+                values = _resize(values, n, np.nan)
+                newnames, newvalues = dicts_as_matrix([r.get(name) or {} for r in records])
+                columns[name] = merge_columns(names, values, newnames, newvalues, runids)
+
+            try:
+                self._write_npz(newoffset, status, columns)
+            except (IOError, OSError) as error:
+                logging.warn("failed to compact result store: "+str(error))
+
+        for name in GROUPS:
+            names, values = columns[name]
+            columns[name] = names, values.reshape(values.shape[0], len(names))
+        return newoffset, status, columns
+
+    def load(self, size=0):
+        """Load the ensemble in one pass, compact the log if needed
+
+        Returns status, columns where status is an array of str ('' for runs
+        never recorded) and columns a dict of `(names, values)` pairs for each
+        group. If several records exist for the same run, the last one wins.
+        """
+        _, status, columns = self._compact()
+        status = _resize(status, size, '')
+        for name in GROUPS:
+            names, values = columns[name]
+            columns[name] = names, _resize(values, size, np.nan)
+        return status, columns
+
+    def update(self, runids, status, **groups):
+        """Record many runs at once, directly in columnar form
+
+        * runids : array of run ids
+        * status : str or array of str
+        * groups : `(names, values)` pair for each group, e.g. output=(['x'], values)
+        """
+        runids = np.asarray(runids, dtype=int)
+        if runids.size == 0:
+            return
+        offset, oldstatus, columns = self._compact()
+        n = max(oldstatus.size, runids.max()+1)
+        oldstatus = _resize(oldstatus, n, '')
+        oldstatus[runids] = status
+        for name in GROUPS:
+            names, values = columns[name]
+            values = _resize(values, n, np.nan)
+            newnames, newvalues = groups.get(name) or ([], np.empty((runids.size, 0)))
+            columns[name] = merge_columns(names, values, newnames, newvalues, runids)
+        self._write_npz(offset, oldstatus, columns)
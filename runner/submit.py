@@ -1,7 +1,9 @@
 """Submit job to High Performance Computer
 """
 import os
+import time
 import subprocess
+import multiprocessing
 import tempfile
 import six
 
@@ -66,42 +68,190 @@ class Slurm(JobScript):
         return "\n".join(lines)
 
         
-    def submit(self, jobfile, **kwargs):
-        """Submit job and return jobid
+    def submit(self, jobfile, tracker=None, **kwargs):
+        """Submit job and return a SlurmProcess
+
+        * tracker : SlurmJobTracker, default to one shared by all jobs
         """
         args = [self.make_arg(k, kwargs[k]) for k in kwargs]
         batchcmd = ["sbatch"] + args + [jobfile]
         output = subprocess.check_output(batchcmd)
-        jobid = output.split()[-1]
-        return SlurmProcess(jobid)
+        jobid = output.decode('utf-8').split()[-1]
+        return SlurmProcess(jobid, tracker)
+
+
+# sacct job states
+COMPLETED = 'COMPLETED'
+ACTIVE_STATES = ['PENDING', 'RUNNING', 'REQUEUED', 'RESIZING', 'SUSPENDED',
+                 'CONFIGURING', 'COMPLETING', 'REQUEUE_HOLD', 'REQUEUE_FED',
+                 'SIGNALING', 'STAGE_OUT', 'STOPPED']
+
+ALL_COMPLETED = 'ALL_COMPLETED'
+FIRST_COMPLETED = 'FIRST_COMPLETED'
+
+
+def parse_sacct(output):
+    """parse `sacct --parsable2 --noheader --format JobID,State` output
+
+    Returns {jobid: state}, job steps (e.g. 123.batch) excluded, and the
+    state reduced to its first word (e.g. "CANCELLED by 0" -> "CANCELLED")
+    """
+    states = {}
+    for line in output.splitlines():
+        fields = line.strip().split('|')
+        if len(fields) < 2 or not fields[0] or '.' in fields[0]:
+            continue
+        states[fields[0]] = fields[1].split()[0] if fields[1].strip() else 'PENDING'
+    return states
+
+
+def _aggregate(states):
+    " state of a job array from the states of its tasks "
+    if any(s in ACTIVE_STATES for s in states):
+        return 'RUNNING' if 'RUNNING' in states else 'PENDING'
+    failed = [s for s in states if s != COMPLETED]
+    return failed[0] if failed else COMPLETED
+
+
+class SlurmJobTracker(object):
+    """Track the state of many SLURM jobs with one `sacct` call per interval
+
+    The polling interval grows by `backoff` while no job changes state, up to
+    `max_interval`, and is reset as soon as one does. Job arrays are tracked
+    by their job id, and are done when all their tasks are.
+    """
+    sacct = 'sacct'
+
+    def __init__(self, jobids=(), interval=1., max_interval=60., backoff=1.5):
+        self.jobids = []
+        self.states = {}
+        self.interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        for jobid in jobids:
+            self.add(jobid)
+
+    def add(self, jobid):
+        jobid = str(jobid)
+        if jobid not in self.states:
+            self.jobids.append(jobid)
+            self.states[jobid] = 'PENDING'
+
+    def poll(self):
+        """query all unfinished jobs at once, return the set of jobs whose state changed
+        """
+        active = [j for j in self.jobids if not self.done(j)]
+        if not active:
+            return set()
+        cmd = [self.sacct, '--parsable2', '--noheader', '--format', 'JobID,State', 
+               '--jobs', ','.join(active)]
+        output = subprocess.check_output(cmd).decode('utf-8')
+        rows = parse_sacct(output)
+
+        changed = set()
+        for jobid in active:
+            tasks = [s for j, s in rows.items() if j == jobid or j.startswith(jobid+'_')]
+            if not tasks:
+                continue  # not yet known to the accounting
+            state = _aggregate(tasks)
+            if state != self.states[jobid]:
+                self.states[jobid] = state
+                changed.add(jobid)
+        return changed
+
+    def state(self, jobid):
+        return self.states[str(jobid)]
+
+    def done(self, jobid):
+        return self.state(jobid) not in ACTIVE_STATES
+
+    def returncode(self, jobid):
+        " 0 if completed, 1 if failed, None if not done "
+        if not self.done(jobid):
+            return None
+        return 0 if self.state(jobid) == COMPLETED else 1
+
+    def wait(self, jobids=None, timeout=None, return_when=ALL_COMPLETED):
+        """wait for jobs, like concurrent.futures.wait
+
+        * jobids : subset of tracked jobs, default to all (added if needed)
+        * timeout : max number of seconds to wait, None for no limit
+        * return_when : ALL_COMPLETED or FIRST_COMPLETED
+
+        Returns done, not_done sets of job ids
+        """
+        jobids = [str(j) for j in (self.jobids if jobids is None else jobids)]
+        for jobid in jobids:
+            self.add(jobid)
+        start = time.time()
+        interval = self.interval
+        while True:
+            changed = self.poll()
+            done = set(j for j in jobids if self.done(j))
+            not_done = set(jobids) - done
+            if not not_done or (return_when == FIRST_COMPLETED and done):
+                return done, not_done
+            if timeout is not None and time.time() - start >= timeout:
+                return done, not_done
+            interval = self.interval if changed else min(interval*self.backoff, self.max_interval)
+            if timeout is not None:
+                interval = min(interval, max(timeout - (time.time() - start), 0))
+            time.sleep(interval)
+
+    def as_completed(self, jobids=None, timeout=None):
+        """yield job ids as they complete, like concurrent.futures.as_completed
+        """
+        jobids = set(str(j) for j in (self.jobids if jobids is None else jobids))
+        while jobids:
+            done, jobids = self.wait(jobids, timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                raise multiprocessing.TimeoutError(str(timeout))
+            for jobid in sorted(done):
+                yield jobid
+
+
+_tracker = None
+
+def default_tracker():
+    " tracker shared by the submitted jobs, so that one sacct call polls them all "
+    global _tracker
+    if _tracker is None:
+        _tracker = SlurmJobTracker()
+    return _tracker
 
 
 class SlurmProcess(object):
-    def __init__(self, jobid):
+    def __init__(self, jobid, tracker=None):
         self.jobid = jobid
         self.returncode = None
+        self.tracker = tracker or default_tracker()
+        self.tracker.add(jobid)
+
+    def _state(self):
+        self.tracker.poll()
+        return self.tracker.state(self.jobid)
 
     def running(self):
-        cmd="sacct --job {jobid} | grep -q RUNNING".format(jobid=self.jobid)
-        return subprocess.call(cmd, shell=True) == 0
+        return self._state() == 'RUNNING'
 
     def completed(self):
-        cmd="sacct --job {jobid} | grep -q COMPLETED".format(jobid=self.jobid)
-        return subprocess.call(cmd, shell=True) == 0
+        return self._state() == COMPLETED
 
     def failed(self):
-        cmd="sacct --job {jobid} | grep -q FAILED".format(jobid=self.jobid)
-        return subprocess.call(cmd, shell=True) == 0
+        return self._state() not in ACTIVE_STATES + [COMPLETED]
 
     def wait(self, freq=1):
-        import time
-        while self.running():
-            time.sleep(freq)
-        self.returncode = 0 if self.completed() else 1
+        interval = self.tracker.interval
+        self.tracker.interval = freq
+        try:
+            self.tracker.wait([self.jobid])
+        finally:
+            self.tracker.interval = interval
+        self.returncode = self.tracker.returncode(self.jobid)
         return self.returncode
 
     def kill(self):
-        return subprocess.call("scancel {jobid}".format(jobid=self.jobid))
+        return subprocess.call(["scancel", str(self.jobid)])
 
 
 
@@ -8,3 +8,15 @@ def parse_val(s):
         except:
             val = s
     return val
+
+
+def which(exe):
+    " full path of an executable (searched in PATH if needed), or None "
+    import os
+    if os.path.dirname(exe):
+        return exe if os.path.isfile(exe) else None
+    for path in os.environ.get('PATH', '').split(os.pathsep):
+        candidate = os.path.join(path, exe)
+        if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+            return candidate
+    return None
@@ -11,15 +11,28 @@ import sys
 import multiprocessing
 import six
 from os.path import join
+from collections import namedtuple
 import numpy as np
 
 from runner.tools.tree import autofolder
 from runner.tools.frame import str_dataframe
 from runner.model import Param, Model
+from runner.param import MultiParam
 from runner.xparams import XParams
+from runner.store import ResultStore, dicts_as_matrix, merge_columns
+from runner.registry import RunRegistry
+from runner.progress import Progress
+from runner.schedule import get_cost_model, order_by_cost
+from runner.cache import RunCache
 
 XPARAM = 'params.txt'
 
+# threads to load runner.json files
+LOAD_WORKERS = 16
+
+# timing columns, in display order
+TIMINGS = ['wall', 'setup', 'run', 'postprocess', 'cpu', 'maxrss']
+
 def nans(N):
     a = np.empty(N)
     a.fill(np.nan)
@@ -35,40 +48,45 @@ class XData(XParams):
     pass
 
 
-def _model_output_as_array(m, names=None):
-    if m.status == "success": 
-        if names is None:
-            names = m.output
-        res = [m.output[nm] if not np.ndim(m.output[nm]) else np.mean(m.output[nm]) for nm in names]
-    else:
-        res = np.nan
-    return res
+# columnar view of the ensemble: status array, params and output as XData
+XResults = namedtuple('XResults', ['status', 'params', 'output', 'timing'])
+
+
+def _take_columns(xdata, names):
+    " select columns by name, nan if missing "
+    values = nans((xdata.size, len(names)))
+    for j, nm in enumerate(names):
+        if nm in xdata.names:
+            values[:, j] = xdata.values[:, xdata.names.index(nm)]
+    return values
+
+
+def _exit_worker(signum, frame):
+    sys.exit(1)
 
 
 def init_worker():
     # to handle KeyboardInterrupt manually
     # http://stackoverflow.com/a/6191991/2192272
     signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # on Pool.terminate, unwind so that running models are killed too
+    signal.signal(signal.SIGTERM, _exit_worker)
 
 
-class _AbortableWorker(object):
-    """ to handle TimeOut individually and freeup ressources
-    http://stackoverflow.com/a/29495039/2192272
+class _CatchWorker(object):
+    """ return (arg, result, None, elapsed) or (arg, None, error message, elapsed)
+    instead of raising, so that a failed run does not discard a whole chunk of tasks
     """
-    def __init__(self, func, timeout=None):
+    def __init__(self, func, **kwargs):
         self.func = func
-        self.timeout = timeout
+        self.kwargs = kwargs
 
-    def __call__(self, *args, **kwargs):
-        from multiprocessing.dummy import Pool as ThreadPool
-        p = ThreadPool(1)
-        res = p.apply_async(self.func, args=args, kwds=kwargs)
+    def __call__(self, arg):
+        start = time.time()
         try:
-            out = res.get(self.timeout)  # Wait timeout seconds for func to complete.
-            return out
-        except multiprocessing.TimeoutError:
-            p.terminate()
-            raise multiprocessing.TimeoutError(str(self.timeout))
+            return arg, self.func(arg, **self.kwargs), None, time.time() - start
+        except Exception as error:
+            return arg, None, "{}:{}".format(type(error).__name__, str(error)), time.time() - start
 
 
 class _PickableMethod(object):
@@ -83,9 +101,52 @@ class _PickableMethod(object):
         return getattr(self.obj, self.method)(*args, **kwargs)
 
 
+def _log_summary(successes, N):
+    if successes == N:
+        logging.info("all runs finished successfully")
+
+    elif successes > 0:
+        logging.warn("{} out of {} runs completed successfully".format(successes, N))
+    else:
+        logging.error("all runs failed")
+
+
+def _open_store(expdir, store):
+    if not store:
+        return None
+    if store == 'sqlite':
+        return RunRegistry(expdir)
+    if store is True:
+        registry = RunRegistry(expdir)
+        return registry if registry.exists() else ResultStore(expdir)
+    return store  # instance
+
+
 class XRun(object):
 
-    def __init__(self, model, params, expdir='./', autodir=False, rundir_template='{}', max_workers=None, timeout=31536000):
+    def __init__(self, model, params, expdir='./', autodir=False, rundir_template='{}', max_workers=None, timeout=31536000, store=True, cache=False, chunksize=1, run_cache=None, batchsize=1, cost=None):
+        """
+        * max_workers : size of the worker pool, default to the number of CPUs
+        * chunksize : number of runs sent at once to a worker (see multiprocessing.Pool.imap)
+        * batchsize : number of runs per worker task, run back to back (or 
+            with a single model call, see ModelInterface `batch_args`) and 
+            returned as plain output, to reduce per-run overhead for cheap models
+        * store : if True, record status, params and output of each run in a
+            columnar store in expdir (see runner.store), from which the
+            `get_*` accessors read the whole ensemble in one pass.
+            "sqlite" for an SQLite registry instead (see runner.registry),
+            which is also picked if True and one already exists in expdir.
+        * cache : if True, load the ensemble once and have all `get_*`
+            accessors reuse it, until `clear_cache()` is called (or new runs)
+        * run_cache : runner.cache.RunCache instance or directory, optional
+            runs identical to a previous successful run (same command, 
+            environment, param file and executable) are not executed again,
+            their files and output are reused instead
+        * cost : expected run cost from parameters, to submit the longest 
+            runs first: expression of parameter names (str), callable 
+            `f(values, names)` or runner.schedule.CostModel instance (e.g.
+            RegressionCost fitted on the timings of a previous experiment)
+        """
         self.model = model
         self.params = params  # XParams class
         self.expdir = expdir
@@ -93,7 +154,33 @@ class XRun(object):
         self.rundir_template = rundir_template
         self.max_workers = max_workers
         self.timeout = timeout
+        self.chunksize = chunksize
+        self.batchsize = batchsize
+        self.store = store
+        self.cache = cache
+        self._cache = None
+        self._memory = None  # results of run_matrix
+        if run_cache is not None and not isinstance(run_cache, RunCache):
+            run_cache = RunCache(run_cache)
+        self.run_cache = run_cache
+        self.cost = get_cost_model(cost)
  
+    @property
+    def store(self):
+        " result store in the current expdir (None if disabled) "
+        if self._store_expdir != self.expdir:
+            if self._store_expdir is not None:
+                # expdir changed (e.g. next iteration of runner.iis)
+                self.clear_cache()
+            self._store = _open_store(self.expdir, self._store_option)
+            self._store_expdir = self.expdir
+        return self._store
+
+    @store.setter
+    def store(self, store):
+        self._store_option = store
+        self._store_expdir = None
+
     def setup(self, force=False):
         """Create directory and write experiment params
         """
@@ -106,6 +193,11 @@ class XRun(object):
             raise RuntimeError(repr(pfile)+" param file already exists")
         self.params.write(join(self.expdir, XPARAM))
 
+        # new ensemble: discard any previous record
+        if self.store is not None:
+            self.store.clear()
+        self.clear_cache()
+
     def get_rundir(self, runid):
         if runid is None:
             return join(self.expdir, 'default')
@@ -137,93 +229,512 @@ class XRun(object):
             yield self[i]
 
 
+    def _store_record(self, runid, m, status, info=None):
+        params = dict(getattr(self.model.interface, 'defaults', None) or {})
+        params.update(m.params)
+        return runid, status, {'params': params, 'output': m.output, 'timing': m.timing, 'info': info}
+
+    def _record(self, runid, m, status, info=None):
+        """ append run to the result store
+        * info : dict of run metadata (start, end, returncode), optional
+        """
+        if self.store is None or runid is None:
+            return
+        self.store.extend([self._store_record(runid, m, status, info)])
+
     def _run(self, i, **kwargs):
-        return self[i].run(**kwargs)
+        m = self[i]
+        start = time.time()
+        try:
+            # with a result store, runner.json is only written at the end
+            m.run(timeout=self.timeout, cache=self.run_cache, 
+                  record_start=self.store is None, timing=m.timing, **kwargs)
+        except Exception as error:
+            info = {'start': start, 'end': time.time(), 
+                    'returncode': getattr(error, 'returncode', None)}
+            self._record(i, m, 'failed', info)
+            raise
+        self._record(i, m, m.status, {'start': start, 'end': time.time(), 'returncode': 0})
+        return m
+
+    def _run_batch(self, indices, **kwargs):
+        """run a slice of the ensemble in one worker task
+
+        Returns a list of `(runid, output, error message)`, and records all 
+        runs to the store at once.
+        """
+        members = [self[i] for i in indices]
+        start = time.time()
+        results = self.model.interface.run_batch(
+            [m.rundir for m in members], [m.params for m in members],
+            timeout=self.timeout, cache=self.run_cache, record_start=self.store is None, 
+            timings=[m.timing for m in members], **kwargs)
+        end = time.time()
+
+        records = []
+        for i, m, (output, error) in zip(indices, members, results):
+            m.output = output
+            info = {'start': start, 'end': end, 'returncode': None if error else 0}
+            if i is not None:
+                records.append(self._store_record(i, m, 'failed' if error else 'success', info))
+        if self.store is not None:
+            self.store.extend(records)
+        return [(i, output, error) for i, (output, error) in zip(indices, results)]
+
+    def pending(self, indices=None):
+        """Subset of indices not yet run successfully (never run, failed or interrupted)
+
+        Status is read from the result store, so runner.json files are only
+        opened for runs the store does not know about.
+        """
+        if indices is None:
+            indices = six.moves.range(len(self))
+        status = self._load_results().status
+
+        def success(i):
+            if i is None:  # default run, not part of the ensemble
+                m = self._try_load(i)
+                return m is not None and m.status == "success"
+            return status[i] == "success"
 
-    def run(self, indices=None, callback=None, **kwargs):
-        """Wrapper for multiprocessing.Pool.map
+        pending = [i for i in indices if not success(i)]
+        if len(pending) < len(indices):
+            logging.info("resume: skip {} runs already successful".format(len(indices)-len(pending)))
+        return pending
+
+
+    def schedule(self, indices):
+        """order indices by decreasing expected cost (see `cost`), if any
+        """
+        if self.cost is None or len(indices) < 2:
+            return indices
+        ids = [i for i in indices if i is not None]
+        values = np.asarray(self.params.values, dtype=float)[np.asarray(ids, dtype=int)]
+        try:
+            costs = self.cost.predict(values, self.params.names)
+        except Exception as error:
+            logging.warn("cost model failed, keep submission order: "+str(error))
+            return indices
+        return order_by_cost(ids, costs) + [i for i in indices if i is None]
+
+
+    def _split_duplicates(self, indices):
+        """split indices into first occurrences and duplicate parameter sets
+        """
+        seen = set()
+        first, duplicates = [], []
+        for i in indices:
+            key = None if i is None else tuple(self.params.pset_as_array(i))
+            if key in seen:
+                duplicates.append(i)
+            else:
+                seen.add(key)
+                first.append(i)
+        return first, duplicates
+
+
+    def _progress(self, progress, N, concurrency):
+        if progress is True:
+            return Progress(N, self.expdir if os.path.isdir(self.expdir) else None, concurrency)
+        return progress or None
+
+
+    def iter_run(self, indices=None, resume=False, progress=False, **kwargs):
+        """Run the ensemble and yield `(runid, FrozenModel)` as each run completes
+
+        Indices are streamed to at most `max_workers` processes (by default
+        the number of CPUs) in chunks of `chunksize` runs (or of `chunksize`
+        batches of `batchsize` runs). Failed runs are
+        yielded with status "failed". Closing the iterator early terminates
+        the remaining runs.
+
+        * resume : if True, only run members not yet successful (see `pending`)
+        * progress : if True, report progress on the terminal and in 
+            expdir/progress.json (see runner.progress), or a Progress instance
+
+        With a `run_cache`, duplicate parameter sets are scheduled after all
+        first occurrences have completed, so that they are served from cache.
+        With a `cost` model, the runs expected to take longest are submitted first.
         """
         if indices is None:
-            N = len(self)
-            indices = six.moves.range(N)
+            indices = six.moves.range(len(self))
+        if resume:
+            indices = self.pending(indices)
+        N = len(indices)
+        if N == 0:
+            return
+
+        if self.run_cache is not None:
+            batches = [b for b in self._split_duplicates(indices) if b]
         else:
-            N = len(indices)
+            batches = [indices]
+        batches = [self.schedule(b) for b in batches]
+
+        self.clear_cache()  # no need to send it to workers
 
         # workers pool
-        pool = multiprocessing.Pool(self.max_workers or N, init_worker)
+        ntasks = (N + self.batchsize - 1) // self.batchsize
+        workers = min(self.max_workers or multiprocessing.cpu_count(), ntasks)
+        pool = multiprocessing.Pool(workers, init_worker)
 
         # prepare method
-        run_model = _PickableMethod(self, '_run')
-        run_model = _AbortableWorker(run_model, timeout=self.timeout)
-
-        ares = [pool.apply_async(run_model, (i,), kwds=kwargs, callback=callback) for i in indices]
+        if self.batchsize > 1:
+            run_batch = _PickableMethod(self, '_run_batch')
+            run_batch = _CatchWorker(run_batch, **kwargs)
+        else:
+            run_model = _PickableMethod(self, '_run')
+            run_model = _CatchWorker(run_model, **kwargs)
+
+        def completed():
+            for batch in batches:
+                if self.batchsize == 1:
+                    for res in pool.imap_unordered(run_model, batch, self.chunksize):
+                        yield res
+                    continue
+                slices = [batch[k:k+self.batchsize] for k in range(0, len(batch), self.batchsize)]
+                for subset, results, error, elapsed in pool.imap_unordered(run_batch, slices, self.chunksize):
+                    if error is not None:
+                        results = [(i, None, error) for i in subset]
+                    for i, output, error in results:
+                        m = self[i]
+                        if error is None:
+                            m.output = output
+                            m.status = "success"
+                        yield i, m, error, elapsed / len(subset)
+
+        progress = self._progress(progress, N, workers*self.batchsize)
+        successes = 0
+        try:
+            for runid, m, error, elapsed in completed():
+                if error is None:
+                    successes += 1
+                else:
+                    logging.warn("run {} failed:{}".format(runid, error))
+                    m = self[runid]
+                    m.status = "failed"
+                if progress is not None:
+                    progress.update(runid, m.status, elapsed)
+                yield runid, m
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+            if progress is not None:
+                progress.close()
+
+        self.clear_cache()
+        _log_summary(successes, N)
+
+
+    def run(self, indices=None, callback=None, resume=False, progress=False, **kwargs):
+        """Run the ensemble on a pool of long-lived workers (see `iter_run`)
+
+        * callback : called with each successful FrozenModel, as runs complete
+        * resume : if True, only run members not yet successful (see `pending`)
+        * progress : report progress (see `iter_run`)
+
+        Return the list of FrozenModel (None for failed or skipped runs), in indices order.
+        """
+        if indices is None:
+            indices = six.moves.range(len(self))
+        results = {}
+        for runid, m in self.iter_run(indices, resume=resume, progress=progress, **kwargs):
+            if m.status == "success":
+                results[runid] = m
+                if callback is not None:
+                    callback(m)
+        return [results.get(i) for i in indices]
+
+
+    def run_async(self, indices=None, callback=None, resume=False, progress=False, **kwargs):
+        """Run the ensemble as asyncio subprocesses from one event loop
+
+        Meant for I/O-bound models or external binaries (command-line models
+        run via ModelInterface.run). At most `max_workers` runs (by default
+        the number of CPUs) are in flight at once, each killed after `timeout`
+        seconds. Requires python 3.5+. See `pending` for `resume` and 
+        `iter_run` for `progress`.
+        Return the list of FrozenModel (None for failed runs).
+        """
+        from runner.aio import run_ensemble
 
+        if indices is None:
+            indices = six.moves.range(len(self))
+        if resume:
+            indices = self.pending(indices)
+        N = len(indices)
+        if N == 0:
+            return []
+
+        self.clear_cache()
+
+        concurrency = self.max_workers or multiprocessing.cpu_count()
+        progress = self._progress(progress, N, concurrency)
+        order = self.schedule(indices)  # longest first, if cost model
+        try:
+            results = run_ensemble(self, order, concurrency, timeout=self.timeout, 
+                                   callback=callback, progress=progress, **kwargs)
+        finally:
+            if progress is not None:
+                progress.close()
+        results = dict(zip(order, results))
         res = []
         successes = 0
-        for i,r in enumerate(ares):
-            try:
-                res.append(r.get(1e9))
+        for i in indices:
+            m, error = results[i]
+            if error is None:
                 successes += 1
+            else:
+                logging.warn("run {} failed:{}".format(i, error))
+            res.append(m)
+
+        self.clear_cache()
+        _log_summary(successes, N)
+        return res
+
+
+    def submit_array(self, indices=None, resume=False, throttle=None, wait=True, 
+                     poll=10, progress=False, **opt):
+        """Submit the ensemble as a single SLURM job array (see runner.slurm)
+
+        * throttle : max number of array tasks running at once (`--array=...%N`)
+        * wait : if True, wait for completion, tracked from the result store
+            (or runner.json files), every `poll` seconds
+        * progress : report progress (see `iter_run`)
+        * **opt : other sbatch options, e.g. time="01:00:00"
+
+        Returns the SlurmArray instance (with `jobid`).
+        """
+        from runner.slurm import SlurmArray
+
+        if indices is None:
+            indices = six.moves.range(len(self))
+        if resume:
+            indices = self.pending(indices)
+        if None in list(indices):
+            logging.warn("default run is not part of the job array: skipped")
+        indices = [i for i in indices if i is not None]
+
+        job = SlurmArray(self, indices, throttle=throttle, **opt)
+        if not indices:
+            return job
+        self.clear_cache()
+        job.submit()
+        if wait:
+            progress = self._progress(progress, len(indices), throttle or len(indices))
+            successes = job.wait(poll, progress=progress)
+            _log_summary(successes, len(indices))
+        return job
+
+
+    def run_matrix(self, indices=None):
+        """Run a vectorized model (VectorModelInterface) on the parameter matrix
+
+        The model is called in-process on chunks of `XParams.values`, with no
+        run directory. Results are kept in memory, for the `get_*` accessors
+        and `analyze` (until `clear_cache` or new runs), and recorded in the 
+        result store.
+
+        Returns output as XData (nan for failed runs), in indices order.
+        """
+        interface = self.model.interface
+        if indices is None:
+            indices = np.arange(len(self))
+        indices = np.asarray(indices, dtype=int)
+
+        self.clear_cache()
+        if np.unique(indices).size == len(self):
+            # whole ensemble: no need to look for previous runs on disk
+            status = np.empty(len(self), dtype=object)
+            status.fill('')
+            params, output = XData(nans((len(self), 0)), []), XData(nans((len(self), 0)), [])
+            timing = XData(nans((len(self), 0)), [])
+        else:
+            status, params, output, timing = self._load_results()
+
+        allvalues = np.asarray(self.params.values, dtype=float)
+        pnames, onames, tnames = list(params.names), list(output.names), list(timing.names)
+        pvalues, ovalues, tvalues = params.values, output.values, timing.values
+        chunksize = interface.chunksize or indices.size
+        successes = 0
+        for k in range(0, indices.size, chunksize):
+            rows = indices[k:k+chunksize]
+            values = allvalues[rows]
+            start = time.time()
+            try:
+                names, newvalues = interface.evaluate(values, self.params.names)
             except Exception as error:
-                logging.warn("run {} failed:{}:{}".format(i, type(error).__name__, str(error)))
+                logging.warn("runs {} to {} failed:{}:{}".format(
+                    rows[0], rows[-1], type(error).__name__, str(error)))
+                status[rows] = 'failed'
+                self._update_store(rows, 'failed')
+                continue
+            status[rows] = 'success'
+            successes += rows.size
+            pnames, pvalues = merge_columns(pnames, pvalues, self.params.names, values, rows)
+            onames, ovalues = merge_columns(onames, ovalues, names, newvalues, rows)
+            # chunk time shared among members
+            wall = np.empty((rows.size, 1))
+            wall.fill((time.time() - start) / rows.size)
+            tnames, tvalues = merge_columns(tnames, tvalues, ['wall'], wall, rows)
+            self._update_store(rows, 'success', params=(self.params.names, values), 
+                               output=(names, newvalues), timing=(['wall'], wall))
+
+        self._memory = XResults(status, XData(pvalues, pnames), XData(ovalues, onames), 
+                                XData(tvalues, tnames))
+        _log_summary(successes, indices.size)
+        output = self.get_output()
+        return XData(output.values[indices], output.names)
+
+
+    def _update_store(self, rows, status, **groups):
+        if self.store is None:
+            return
+        try:
+            self.store.update(rows, status, **groups)
+        except (IOError, OSError) as error:
+            logging.warn("failed to record runs to the result store: "+str(error))
+
+
+    def postprocess(self):
+        """read the output of successful runs again from their run directory
+
+        Runs without runner.json (in-process models, `run_matrix`) are 
+        skipped: their output is only in the result store.
+        """
+        status = self._load_results().status
+        res = []
+        skipped = 0
+        for i, m in enumerate(self):
+            if status[i] == "success" and not os.path.exists(m.runfile):
+                skipped += 1
                 res.append(None)
+            elif status[i] == "success":
+                m.load().postprocess()
+                self._record(i, m, m.status)
+                res.append(m)
+            else:
+                res.append(None)
+        if skipped:
+            logging.warn("postprocess: {} successful runs without run directory skipped".format(skipped))
+        self.clear_cache()
+        return res
+
 
-        if successes == N:
-            logging.info("all runs finished successfully")
+    def clear_cache(self):
+        " invalidate the ensemble loaded by `get_*` accessors (see `cache`) "
+        self._cache = None
+        self._memory = None
 
-        elif successes > 0:
-            logging.warn("{} out of {} runs completed successfully".format(successes, N))
+
+    def _load_results(self):
+        """Status, params and output of all runs, as columns (XResults)
+
+        Runs are read from the result store in a single pass. Only runs
+        the store does not know about are loaded from their runner.json,
+        in parallel threads. The result is kept if `cache` is True.
+        """
+        if self._memory is not None:
+            return self._memory
+        if self.cache and self._cache is not None:
+            return self._cache
+
+        N = len(self)
+        groups = ['params', 'output', 'timing']
+        if self.store is not None and self.store.exists():
+            status, columns = self.store.load(N)
+            status = status[:N].astype(object)
+            columns = {name: (columns[name][0], columns[name][1][:N]) for name in groups}
         else:
-            logging.error("all runs failed")
+            status = np.empty(N, dtype=object)
+            status.fill('')
+            columns = {name: ([], nans((N, 0))) for name in groups}
+
+        missing = np.where(status == '')[0]
+        if missing.size > 1:
+            from multiprocessing.dummy import Pool as ThreadPool
+            pool = ThreadPool(min(LOAD_WORKERS, missing.size))
+            try:
+                models = pool.map(self._try_load, missing)
+            finally:
+                pool.close()
+        else:
+            models = [self._try_load(i) for i in missing]
 
-        return res
+        loaded = [(i, m) for i, m in zip(missing, models) if m is not None]
+        for i, m in loaded:
+            status[i] = m.status or ''
 
+        if loaded:
+            rows = [i for i, m in loaded]
+            for name in groups:
+                names, values = dicts_as_matrix([getattr(m, name) for i, m in loaded])
+                columns[name] = merge_columns(columns[name][0], columns[name][1], names, values, rows)
 
-    def postprocess(self):
-        return [m.postprocess() if m.load().status == "success" else None 
-                for m in self]
+        results = XResults(status, *[XData(columns[name][1], list(columns[name][0])) for name in groups])
+        if self.cache:
+            self._cache = results
+        return results
+
+
+    def _try_load(self, runid):
+        " load frozen model from runner.json, None if not run yet "
+        try:
+            return self[runid].load()
+        except (IOError, OSError, ValueError):
+            return None
 
 
     def get_first_valid(self):
-        for i, m in enumerate(self):
-            if m.load().status == 'success':
-                return i
-        raise ValueError("no successful run")
+        valid = np.where(self._load_results().status == 'success')[0]
+        if valid.size == 0:
+            raise ValueError("no successful run")
+        return valid[0]
 
 
     def get_output_names(self):
-        return self[self.get_first_valid()].load().output.keys()
+        return self._load_results().output.names
 
 
     def get_output(self, names=None):
+        results = self._load_results()
         if names is None:
-            names = self.get_output_names()
-        values = nans((len(self), len(names)))
-        for i, m in enumerate(self):
-            m.load()
-            values[i] = _model_output_as_array(m, names)
-
+            names = results.output.names
+        values = _take_columns(results.output, names)
+        values[results.status != "success"] = np.nan
         return XData(values, names)
 
 
     def _get_params(self, names=None):
         " for checking only "
+        results = self._load_results()
         if names is None:
-            return self[self.get_first_valid()].load().params.keys()
-        values = np.empty((len(self), len(names)))
-        for i, m in enumerate(self):
-            m.load()
-            values[i] = [m.params[nm] for nm in names]
-        return XData(values, names)
+            return results.params.names
+        return XData(_take_columns(results.params, names), names)
+
+
+    def get_timings(self, names=None):
+        """Run timings and resources as XData (nan for runs not recorded)
+
+        Columns (see ModelInterface.run): wall, setup, run, postprocess time 
+        and child cpu time in seconds, maxrss (max resident set size) in KB
+        """
+        results = self._load_results()
+        if names is None:
+            names = [k for k in TIMINGS if k in results.timing.names]
+            names += [k for k in results.timing.names if k not in names]
+        return XData(_take_columns(results.timing, names), names)
 
 
     def get_logliks(self):
+        results = self._load_results()
         names = self.model.likelihood.names
+        output = _take_columns(results.output, names)
         values = nans((len(self), len(names)))
-        for i, m in enumerate(self):
-            m.load()
-            if m.status == "success": 
-                values[i] = m.likelihood.logpdf()
+        success = results.status == "success"
+        values[success] = self.model.likelihood.logpdf_matrix(output[success])
         return XData(values, names)
 
 
@@ -236,20 +747,21 @@ class XRun(object):
         if names is None:
             names = self.model.likelihood.names
 
+        results = self._load_results()
         values = np.zeros((len(self), len(names)), dtype=bool)
-        for i, m in enumerate(self):
-            m.load()
-            if m.status != "success": 
-                continue
-            if alpha is None:
-                values[i] = True
-            else:
-                values[i] = [m.likelihood[name].isvalid(alpha) for name in names]
+        success = results.status == "success"
+        if alpha is None:
+            values[success] = True
+        else:
+            likelihood = MultiParam([self.model.likelihood[name] for name in names])
+            output = _take_columns(results.output, names)
+            values[success] = likelihood.isvalid_matrix(output[success], alpha)
         return XData(values, names)
 
 
     def get_valid(self, alpha=None, names=None):
-        return self.get_valids(alpha, names).values.all(axis=1)
+        success = self._load_results().status == "success"
+        return success & self.get_valids(alpha, names).values.all(axis=1)
 
 
     def analyze(self, names=None, anadir=None):
@@ -5,7 +5,8 @@ from utils import runner
 
 from runner.tools.dist import dist_todict, dist_fromkw
 from runner.tools.dist import dist_todict2, dist_fromkw2, DiscreteDist
-from runner.param import Param
+from runner.param import Param, MultiParam
+import numpy as np
 
 
 class TestDistScipy(unittest.TestCase):
@@ -65,5 +66,28 @@ class TestParamIO(unittest.TestCase):
         self.assertEqual(Param.fromkw(**self.b.as_dict()), self.b)
 
 
+class TestMultiParamMatrix(unittest.TestCase):
+    def setUp(self):
+        self.params = MultiParam([Param.parse('a=N?3,2'), Param.parse('b=U?-1,1')])
+        self.values = np.array([[3., 0.], [10., 0.5], [np.nan, 2.], [-1., -0.99]])
+
+    def test_logpdf(self):
+        expected = [self.params(a=a, b=b).logpdf() for a, b in self.values]
+        np.testing.assert_allclose(self.params.logpdf_matrix(self.values), expected)
+
+    def test_isvalid(self):
+        for alpha in [0.99, 0.67]:
+            expected = [self.params(a=a, b=b).isvalid(alpha) for a, b in self.values]
+            self.assertEqual(self.params.isvalid_matrix(self.values, alpha).tolist(),
+                             np.array(expected).tolist())
+
+    def test_interval_cache(self):
+        a = self.params['a']
+        self.assertEqual(a.interval(0.67), tuple(a.dist.interval(0.67)))
+        self.assertIn(0.67, a._intervals)
+        a.dist = Param.parse('a=N?0,1').dist  # recomputed for a new dist
+        self.assertEqual(a.interval(0.67), tuple(a.dist.interval(0.67)))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -206,6 +206,19 @@ class TestRunIndices(TestRunBase):
                          """.strip())
 
 
+class TestRunContinue(TestRunBase):
+
+    def test_continue(self):
+        getoutput(JOB+' run -p a=2,3,4 -o out -j 0,2 -- echo --a {a}')
+        getoutput(JOB+' run --continue -o out -- echo --a {a}')
+        out = getoutput('cat out/*/log.out')  # not run twice
+        self.assertEqual(out.strip(),"""
+--a 2
+--a 3.0
+--a 4
+                         """.strip())
+
+
 class TestAnalyze(unittest.TestCase):
 
     fileout = 'output.json'
@@ -0,0 +1,203 @@
+from __future__ import absolute_import
+import unittest
+import time
+import numpy as np
+from utils import runner
+
+from runner.lib.doelhs import lhs, _pdist, _mindist, _lhsclassic, _maxcorr
+from runner.lib.doelhs import _sqdist_blocks, _phip, _ese_exchanges
+from runner.lib import lhsmdu, pynolh
+from runner.param import Param, MultiParam
+
+
+def _brute_pdist(x):
+    m = x.shape[0]
+    return np.array([np.sqrt(((x[j]-x[i])**2).sum()) for i in range(m-1) for j in range(i+1, m)])
+
+
+def _is_latin(H):
+    " one point in each of the n intervals, for every factor "
+    n = H.shape[0]
+    return all(sorted(np.floor(H[:, j]*n).astype(int)) == list(range(n)) for j in range(H.shape[1]))
+
+
+class TestDistance(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(0)
+        self.x = np.random.rand(37, 3)
+
+    def test_pdist(self):
+        ref = _brute_pdist(self.x)
+        for blocksize in None, 1, 4, 100:
+            self.assertTrue(np.allclose(_pdist(self.x, blocksize), ref))
+
+    def test_mindist(self):
+        ref = _brute_pdist(self.x).min()
+        for blocksize in None, 1, 4, 100:
+            self.assertAlmostEqual(_mindist(self.x, blocksize=blocksize), ref)
+        self.assertTrue(_mindist(self.x, bound=1.) <= 1.)
+        self.assertEqual(_mindist(self.x[:1]), np.inf)
+
+
+class TestLHS(unittest.TestCase):
+
+    def test_maximin(self):
+        np.random.seed(1)
+        for criterion in 'maximin', 'centermaximin':
+            H = lhs(4, 50, criterion, 10)
+            self.assertEqual(H.shape, (50, 4))
+            self.assertTrue(_is_latin(H))
+
+    def test_maximin_better(self):
+        np.random.seed(2)
+        best = _mindist(lhs(3, 30, 'maximin', 20))
+        np.random.seed(2)
+        first = _mindist(lhs(3, 30, 'maximin', 1))
+        self.assertTrue(best >= first)
+
+    def test_ese(self):
+        phip = lambda H: (_pdist(H)**-50.).sum()**(1/50.)
+        np.random.seed(3)
+        H0 = _lhsclassic(3, 40)  # initial design of ese
+        np.random.seed(3)
+        H = lhs(3, 40, 'ese', 10)
+        self.assertTrue(_is_latin(H))
+        self.assertTrue(phip(H) < phip(H0))
+        self.assertTrue(_mindist(H) > _mindist(H0))
+
+    def test_ese_exchange(self):
+        # incremental phi_p of an exchange == phi_p recomputed after it
+        np.random.seed(5)
+        p = 50
+        H = _lhsclassic(3, 40)
+        D2 = np.concatenate([d2 for _, d2 in _sqdist_blocks(H)])
+        np.fill_diagonal(D2, np.inf)
+        scale = D2.min()
+        D2 /= scale
+        phi = _phip(D2, p)
+        k = 1
+        i1 = np.random.randint(40, size=20)
+        i2 = (i1 + np.random.randint(1, 40, size=20)) % 40
+        phis, R1, R2 = _ese_exchanges(D2, H[:, k], scale, phi, p, i1, i2)
+        for j in range(20):
+            H2 = H.copy()
+            H2[[i1[j], i2[j]], k] = H2[[i2[j], i1[j]], k]
+            D22 = np.concatenate([d2 for _, d2 in _sqdist_blocks(H2)])
+            np.fill_diagonal(D22, np.inf)
+            D22 /= scale
+            self.assertAlmostEqual(phis[j]/_phip(D22, p), 1, places=8)
+            self.assertTrue(np.allclose(R1[j], D22[i1[j]]))
+            self.assertTrue(np.allclose(R2[j], D22[i2[j]]))
+
+    def test_ese_maxtime(self):
+        start = time.time()
+        H = lhs(3, 200, 'ese', maxtime=0.5)
+        self.assertTrue(time.time() - start < 5)
+        self.assertTrue(_is_latin(H))
+
+    def test_correlation(self):
+        np.random.seed(4)
+        H0 = _lhsclassic(6, 500)
+        for criterion in 'correlation', 'corr':
+            np.random.seed(4)
+            H = lhs(6, 500, criterion, 5)
+            self.assertEqual(H.shape, (500, 6))
+            self.assertTrue(_is_latin(H))
+            self.assertTrue(_maxcorr(H) < _maxcorr(H0))
+
+    def test_correlation_few_samples(self):
+        H = lhs(5, 3, 'correlation', 5)
+        self.assertTrue(_is_latin(H))
+
+    def test_sample_lhs(self):
+        prior = MultiParam([Param.parse('a=U?0,1'), Param.parse('b=N?0,1')])
+        xparams = prior.sample(1000, seed=3, method='lhs', criterion='maximin', iterations=3)
+        self.assertEqual(np.asarray(xparams.values).shape, (1000, 2))
+
+
+def _brute_lhsmdu_strata(R, numSamples, k=2):
+    " elimination as in the original LHS-MDU implementation "
+    D = np.sqrt(((R.T[:, None] - R.T[None])**2).sum(-1))
+    avg = {i: 0 for i in range(R.shape[1])}
+    while len(avg) > numSamples:
+        keys = sorted(avg)
+        for r in keys:
+            avg[r] = np.sum(sorted(D[r, keys])[:k+1])/k
+        del avg[min(avg, key=avg.get)]
+    return R[:, sorted(avg)]
+
+
+class TestLHSMDU(unittest.TestCase):
+
+    def test_strata(self):
+        rng = np.random.RandomState(5)
+        for dims, numSamples in (3, 12), (2, 30), (4, 1):
+            R = rng.rand(dims, 5*numSamples)
+            S = lhsmdu.eliminateRealizationsToStrata(R, numSamples)
+            self.assertTrue(np.array_equal(S, _brute_lhsmdu_strata(R, numSamples)))
+
+    def test_sample(self):
+        X = lhsmdu.sample(3, 200)
+        self.assertEqual(X.shape, (3, 200))
+        self.assertTrue(_is_latin(X.T))
+
+    def test_reentrant(self):
+        np.random.seed(6)
+        state = np.random.get_state()[1].copy()
+        a = lhsmdu.sample(2, 50, randomSeed=1)
+        lhsmdu.sample(2, 30, randomSeed=2)
+        b = lhsmdu.sample(2, 50, randomSeed=1)
+        self.assertTrue(np.array_equal(a, b))
+        self.assertTrue(np.array_equal(np.random.get_state()[1], state))
+
+    def test_multiparam(self):
+        prior = MultiParam([Param.parse('a=U?0,1'), Param.parse('b=N?0,1')])
+        xparams = prior.sample(500, seed=3, method='lhsmdu')
+        values = np.asarray(xparams.values)
+        self.assertEqual(values.shape, (500, 2))
+        self.assertTrue(_is_latin(values[:, :1]))
+
+
+class TestNOLH(unittest.TestCase):
+
+    def test_design(self):
+        for dim, size in (1, 17), (5, 17), (9, 33), (20, 129), (29, 257):
+            H = pynolh.design(dim)
+            self.assertEqual(H.shape, (size, dim))
+            self.assertTrue(_is_latin(np.clip(H, 0, 1-1e-9)))
+        self.assertTrue(pynolh.design(5) is pynolh.design(5))
+        self.assertRaises(ValueError, pynolh.design, 30)
+
+    def test_orthogonal(self):
+        H = pynolh.design(7)
+        self.assertTrue(_maxcorr(H) < 1e-10)
+
+    def test_nolh(self):
+        # configuration of 0-based numbers, q != 8
+        H = pynolh.nolh(list(range(16)), [])
+        self.assertEqual(H.shape, (33, 11))
+        self.assertEqual((H.min(), H.max()), (0., 1.))
+
+    def test_multiparam(self):
+        prior = MultiParam([Param.parse('a=U?0,1'), Param.parse('b=N?0,1')])
+        values = np.asarray(prior.sample(None, method='nolh').values)
+        self.assertEqual(values.shape, (17, 2))
+        self.assertTrue(_is_latin(values[:, :1]))
+        self.assertTrue(np.isfinite(values).all())
+        values = np.asarray(prior.sample(33, seed=1, method='nolh').values)
+        self.assertEqual(values.shape, (33, 2))
+        self.assertRaises(ValueError, prior.sample, 20, method='nolh')
+        self.assertRaises(ValueError, prior.sample, 34, method='nolh')
+
+    def test_multiparam_copies(self):
+        # stacked copies: no duplicate (centre) point, still latin
+        prior = MultiParam([Param.parse('a=U?0,1'), Param.parse('b=U?0,1'), Param.parse('c=U?0,1')])
+        values = np.asarray(prior.sample(17 + 2*16, seed=2, method='nolh').values)
+        self.assertEqual(values.shape, (49, 3))
+        self.assertEqual(len(set(map(tuple, values))), 49)
+        self.assertTrue(_is_latin(values))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,704 @@
+from __future__ import absolute_import
+import unittest
+import os, sys, shutil, glob, time, json
+import tempfile
+import numpy as np
+import six
+from utils import runner
+
+from runner.model import Model, ModelInterface, PythonModelInterface, VectorModelInterface
+from runner.filetype import LineSeparator, JsonFile
+from runner.param import MultiParam, DiscreteParam, Param
+from runner.xrun import XRun
+from runner.xparams import XParams
+from runner.cache import RunCache
+from runner.progress import Progress
+from runner.schedule import RegressionCost
+from runner.slurm import format_array_indices
+from runner import submit
+from runner.submit import SlurmJobTracker, SlurmProcess, parse_sacct, FIRST_COMPLETED
+
+
+def dummy_model(likelihood=None):
+    interface = ModelInterface('python examples/dummy.py {} --aa {a} --bb {b}',
+                               filetype_output=LineSeparator(),
+                               filename_output='output')
+    return Model(interface, likelihood=likelihood)
+
+
+def dummy_params():
+    return MultiParam([DiscreteParam.parse('a=1,2,3'),
+                       DiscreteParam.parse('b=0,1')]).product()
+
+
+class TestXRunBase(unittest.TestCase):
+
+    def setUp(self):
+        self.expdir = tempfile.mkdtemp(prefix='runner_test_')
+
+    def tearDown(self):
+        shutil.rmtree(self.expdir)
+
+    def xrun(self, **kwargs):
+        model = dummy_model(likelihood=[Param.parse('aa=N?2,1')])
+        return XRun(model, dummy_params(), expdir=self.expdir, **kwargs)
+
+
+class TestResultStore(TestXRunBase):
+
+    def test_store(self):
+        xrun = self.xrun()
+        xrun.setup()
+        xrun.run()
+        self.assertTrue(xrun.store.exists())
+
+        # the store alone is enough: runner.json files are not needed
+        for f in glob.glob(os.path.join(self.expdir, '*', 'runner.json')):
+            os.remove(f)
+
+        self.assertEqual(xrun.get_valid().tolist(), [True]*6)
+        output = xrun.get_output(['aa', 'bb'])
+        self.assertEqual(output.values.tolist(), np.asarray(xrun.params.values).tolist())
+        self.assertEqual(xrun._get_params(['a','b']).values.tolist(),
+                         np.asarray(xrun.params.values).tolist())
+
+    def test_store_vs_runfiles(self):
+        xrun = self.xrun()
+        xrun.setup()
+        xrun.run()
+        xrun_nostore = self.xrun(store=False)
+        np.testing.assert_equal(xrun.get_output(['aa','bb']).values,
+                                xrun_nostore.get_output(['aa','bb']).values)
+        np.testing.assert_equal(xrun.get_logliks().values,
+                                xrun_nostore.get_logliks().values)
+
+    def test_partial(self):
+        xrun = self.xrun()
+        xrun.setup()
+        xrun.run(indices=[0, 2])
+        self.assertEqual(xrun.get_valid().tolist(),
+                         [True, False, True, False, False, False])
+        self.assertTrue(np.isnan(xrun.get_output(['aa']).values[1]).all())
+
+    def test_last_record_wins(self):
+        xrun = self.xrun()
+        store = xrun.store
+        store.append(1, 'failed', output={})
+        store.append(1, 'success', output={'x': 2.})
+        store.append(0, 'success', output={'x': 1., 'y': [1, 3]})
+        status, columns = store.load(3)
+        self.assertEqual(status.tolist(), ['success', 'success', ''])
+        names, values = columns['output']
+        self.assertEqual(names, ['x', 'y'])
+        np.testing.assert_equal(values, [[1., 2.], [2., np.nan], [np.nan, np.nan]])
+
+        # compacted: same result from npz + empty tail
+        store.append(2, 'failed')
+        status, columns = store.load(3)
+        self.assertEqual(status.tolist(), ['success', 'success', 'failed'])
+        np.testing.assert_equal(columns['output'][1][:2], [[1., 2.], [2., np.nan]])
+
+    def test_expdir_change(self):
+        # e.g. runner.iis moves on to the next iteration
+        xrun = self.xrun()
+        xrun.setup()
+        xrun.run(indices=[0])
+        first = xrun.expdir
+        xrun.expdir = os.path.join(self.expdir, 'next')
+        xrun.setup()
+        xrun.run(indices=[1])
+        self.assertTrue(os.path.exists(os.path.join(first, 'results.log')))
+        self.assertEqual(xrun.get_valid().tolist(), [False, True] + [False]*4)
+        xrun.expdir = first
+        self.assertEqual(xrun.get_valid().tolist(), [True] + [False]*5)
+
+    def test_malformed_record(self):
+        xrun = self.xrun()
+        store = xrun.store
+        store.append(0, 'success', output={'x': 1.})
+        with open(store.logfile, 'a') as f:
+            f.write('{"index": 1, "stat\n')  # e.g. truncated by a crash
+        store.append(1, 'success', output={'x': 2.})
+        status, columns = store.load(2)
+        self.assertEqual(status.tolist(), ['success', 'success'])
+        np.testing.assert_equal(columns['output'][1], [[1.], [2.]])
+
+
+class TestRegistry(TestXRunBase):
+
+    def test_registry(self):
+        xrun = self.xrun(store='sqlite', max_workers=3)
+        xrun.setup()
+        xrun.run()
+        self.assertTrue(os.path.exists(os.path.join(self.expdir, 'registry.db')))
+        self.assertFalse(os.path.exists(os.path.join(self.expdir, 'results.log')))
+        self.assertEqual(xrun.store.count('success'), 6)
+
+        for f in glob.glob(os.path.join(self.expdir, '*', 'runner.json')):
+            os.remove(f)
+
+        # picked by default when present
+        xrun = self.xrun()
+        self.assertEqual(type(xrun.store).__name__, 'RunRegistry')
+        self.assertEqual(xrun.get_valid().tolist(), [True]*6)
+        self.assertEqual(xrun.get_output(['aa', 'bb']).values.tolist(), 
+                         np.asarray(xrun.params.values).tolist())
+
+        status, columns = xrun.store.load(6)
+        names, info = columns['info']
+        self.assertEqual(names, ['start', 'end', 'returncode'])
+        self.assertTrue((info[:, 1] >= info[:, 0]).all())
+        self.assertEqual(info[:, 2].tolist(), [0]*6)
+
+    def test_last_record_wins(self):
+        xrun = self.xrun(store='sqlite')
+        store = xrun.store
+        store.append(1, 'failed', output={'y': 1})
+        store.append(1, 'success', output={'x': 2.})
+        store.update([0, 2], 'failed', output=(['x'], np.array([[1.], [3.]])))
+        status, columns = store.load(4)
+        self.assertEqual(status.tolist(), ['failed', 'success', 'failed', ''])
+        names, values = columns['output']
+        self.assertEqual(names, ['x'])
+        np.testing.assert_equal(values[:, 0], [1., 2., 3., np.nan])
+        self.assertEqual(store.runids('failed'), [0, 2])
+
+
+class TestRunPool(TestXRunBase):
+
+    def failing_xrun(self, **kwargs):
+        # run fails for a == 2
+        interface = ModelInterface(['python', '-c', 'import sys; sys.exit({a} == 2)'])
+        return XRun(Model(interface), dummy_params(), expdir=self.expdir, **kwargs)
+
+    def test_chunks(self):
+        xrun = self.failing_xrun(max_workers=2, chunksize=4)
+        xrun.setup()
+        res = xrun.run()
+        self.assertEqual([m is not None for m in res], [True, True, False, False, True, True])
+        self.assertEqual(xrun.get_valid().tolist(), [True, True, False, False, True, True])
+
+    def test_iter_run(self):
+        # larger a finish first
+        interface = ModelInterface(['python', '-c', 'import time; time.sleep(0.6*(3-{a}))'])
+        xrun = XRun(Model(interface), dummy_params(), expdir=self.expdir, max_workers=6)
+        xrun.setup()
+        completed = [(runid, m.status) for runid, m in xrun.iter_run()]
+        self.assertEqual(sorted(completed), [(i, 'success') for i in range(6)])
+        self.assertEqual(sorted(runid for runid, _ in completed[:2]), [4, 5])
+        self.assertEqual(sorted(runid for runid, _ in completed[-2:]), [0, 1])
+
+    def test_resume(self):
+        xrun = self.failing_xrun()
+        xrun.setup()
+        xrun.run(indices=[0, 1, 2])
+        self.assertEqual(xrun.pending(), [2, 3, 4, 5])
+        res = xrun.run(resume=True)
+        self.assertEqual([m is not None for m in res], [False, False, False, False, True, True])
+        self.assertEqual(xrun.pending(), [2, 3])
+
+    def test_timeout_kills_children(self):
+        # the model starts a child process that would outlive it
+        interface = ModelInterface(['sh', '-c', 'sleep 30 & echo $! > {}/child.pid; wait'])
+        xrun = XRun(Model(interface), dummy_params(), expdir=self.expdir, timeout=1)
+        xrun.setup()
+        res = xrun.run(indices=[0])
+        self.assertEqual(res, [None])
+        pid = int(open(os.path.join(self.expdir, '0', 'child.pid')).read())
+        time.sleep(0.1)
+        self.assertFalse(_alive(pid))
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    # zombie?
+    if os.path.exists('/proc/{}/stat'.format(pid)):
+        return open('/proc/{}/stat'.format(pid)).read().split()[2] != 'Z'
+    return True
+
+
+class TestProgress(TestXRunBase):
+
+    def test_progress(self):
+        stream = six.StringIO()
+        progress = Progress(10, self.expdir, concurrency=2, interval=1e9, stream=stream)
+        for i, duration in enumerate([1., 2., 3., 4.]):
+            progress.update(i, 'success' if i else 'failed', duration)
+        status = progress.status()
+        self.assertEqual((status['completed'], status['failed'], status['running'], status['pending']), 
+                         (3, 1, 2, 4))
+        self.assertEqual(status['duration_p50'], 2.5)
+        self.assertTrue(status['eta'] > 0)
+        progress.close()
+        self.assertIn('3/10 completed, 1 failed', stream.getvalue())
+        self.assertTrue(json.load(open(progress.statusfile))['done'])
+
+    def test_run_progress(self):
+        xrun = self.xrun(max_workers=2)
+        xrun.setup()
+        xrun.run(progress=Progress(len(xrun), self.expdir, stream=six.StringIO()))
+        status = json.load(open(os.path.join(self.expdir, 'progress.json')))
+        self.assertEqual((status['completed'], status['failed'], status['running']), (6, 0, 0))
+        self.assertEqual(status['eta'], 0)
+
+
+class TestTimings(TestXRunBase):
+
+    def test_timings(self):
+        # a=1,2,3: busy loop of 0.1*a sec
+        interface = ModelInterface(['python', '-c', 'import time; t = time.time()\nwhile time.time() < t + 0.1*{a}: pass'])
+        xrun = XRun(Model(interface), dummy_params(), expdir=self.expdir, max_workers=3)
+        xrun.setup()
+        xrun.run(indices=[0, 2, 4])
+        timings = xrun.get_timings()
+        self.assertEqual(timings.names, ['wall', 'setup', 'run', 'postprocess', 'cpu', 'maxrss'])
+        wall = timings.values[:, 0]
+        self.assertTrue(np.isnan(wall[1]))
+        np.testing.assert_array_less([0.1, 0.2, 0.3], wall[[0, 2, 4]])
+        cpu = timings.values[:, 4]
+        self.assertTrue((cpu[[0, 2, 4]] > 0).all())
+        self.assertTrue((cpu[[0, 2, 4]] <= wall[[0, 2, 4]]).all())
+        self.assertTrue((timings.values[[0, 2, 4], 5] > 0).all())
+
+        # same from runner.json files
+        nostore = XRun(Model(interface), dummy_params(), expdir=self.expdir, store=False)
+        np.testing.assert_equal(nostore.get_timings().values, timings.values)
+
+    def test_timings_python(self):
+        xrun = XRun(Model(PythonModelInterface(_pymodel)), dummy_params(), expdir=self.expdir, batchsize=2)
+        xrun.setup()
+        xrun.run()
+        timings = xrun.get_timings()
+        self.assertEqual(timings.names, ['wall', 'run', 'cpu'])
+        self.assertTrue((timings.values >= 0).all())
+
+
+class TestSchedule(TestXRunBase):
+
+    def test_cost_expression(self):
+        xrun = self.xrun(cost='a*10 - b')
+        self.assertEqual(xrun.schedule(list(range(6))), [4, 5, 2, 3, 0, 1])
+        self.assertEqual(xrun.schedule([None, 0, 5]), [5, 0, None])
+
+    def test_longest_first(self):
+        interface = ModelInterface(['python', '-c', 'import time; time.sleep(0.1*{a})'])
+        xrun = XRun(Model(interface), dummy_params(), expdir=self.expdir, max_workers=1, cost='a')
+        xrun.setup()
+        order = [runid for runid, m in xrun.iter_run()]
+        self.assertEqual(sorted(order[:2]), [4, 5])
+        self.assertEqual(sorted(order[-2:]), [0, 1])
+
+        # regression on timings of a previous run
+        cost = RegressionCost.from_xrun(xrun)
+        self.assertTrue(cost.coefs[1] > 0)  # a
+        xrun2 = XRun(Model(interface), dummy_params(), expdir=self.expdir, cost=cost)
+        self.assertEqual(sorted(xrun2.schedule(list(range(6)))[:2]), [4, 5])
+
+
+FAKE_SBATCH = """#!{python}
+# stand-in for sbatch: run all array tasks locally, in the background
+import sys, os, re, subprocess
+jobfile = sys.argv[-1]
+spec = re.search(r'#SBATCH --array[ =](\\S+)', open(jobfile).read()).group(1)
+open(jobfile+'.spec', 'w').write(spec)
+ids = []
+for part in spec.split('%')[0].split(','):
+    a, _, b = part.partition('-')
+    ids.extend(range(int(a), int(b or a)+1))
+for i in ids:
+    subprocess.Popen(['bash', jobfile], stdout=open(os.devnull, 'w'),
+                     env=dict(os.environ, SLURM_ARRAY_TASK_ID=str(i)))
+print('Submitted batch job 1234')
+"""
+
+
+class TestSlurmArray(TestXRunBase):
+
+    def setUp(self):
+        super(TestSlurmArray, self).setUp()
+        bindir = os.path.join(self.expdir, 'bin')
+        os.makedirs(bindir)
+        sbatch = os.path.join(bindir, 'sbatch')
+        with open(sbatch, 'w') as f:
+            f.write(FAKE_SBATCH.format(python=sys.executable))
+        os.chmod(sbatch, 0o755)
+        self.path = os.environ['PATH']
+        os.environ['PATH'] = bindir + os.pathsep + self.path
+
+    def tearDown(self):
+        os.environ['PATH'] = self.path
+        super(TestSlurmArray, self).tearDown()
+
+    def test_format_indices(self):
+        self.assertEqual(format_array_indices([8, 0, 1, 2, 5, 7]), '0-2,5,7-8')
+
+    def test_array(self):
+        xrun = self.xrun()
+        xrun.setup()
+        job = xrun.submit_array(indices=[0, 1, 2, 4, 5], throttle=2, poll=0.2)
+        self.assertEqual(job.jobid, '1234')
+        self.assertEqual(open(job.jobfile+'.spec').read(), '0-2,4-5%2')
+        self.assertEqual(xrun.get_valid().tolist(), [True, True, True, False, True, True])
+        self.assertEqual(xrun.get_output(['aa']).values[5, 0], 3)
+
+        # only the remaining member
+        job = xrun.submit_array(resume=True, poll=0.2)
+        self.assertEqual(job.indices, [3])
+        self.assertEqual(xrun.get_valid().tolist(), [True]*6)
+
+    def test_array_resume_failed(self):
+        # members that failed are resubmitted: their old status is not final
+        interface = ModelInterface(['sh', '-c', 'sleep 0.5; test -z "$FAIL" && python examples/dummy.py {} --aa {a} --bb {b}'],
+                                   filetype_output=LineSeparator(), filename_output='output')
+        xrun = XRun(Model(interface), dummy_params(), expdir=self.expdir)
+        xrun.setup()
+        os.environ['FAIL'] = '1'
+        try:
+            xrun.submit_array(indices=[0, 1], poll=0.2)
+        finally:
+            del os.environ['FAIL']
+        self.assertEqual(xrun.get_valid().tolist()[:2], [False, False])
+        job = xrun.submit_array(indices=[0, 1], resume=True, poll=0.2)
+        self.assertEqual(job.indices, [0, 1])
+        self.assertEqual(xrun.get_valid().tolist()[:2], [True, True])
+
+
+FAKE_SACCT = """#!{python}
+# stand-in for sacct: log the call, print the states file
+import sys
+open({log!r}, 'a').write(' '.join(sys.argv[1:])+'\\n')
+sys.stdout.write(open({states!r}).read())
+"""
+
+
+class TestSlurmJobTracker(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.log = os.path.join(self.tmpdir, 'sacct.log')
+        self.states = os.path.join(self.tmpdir, 'states')
+        self.set_states('')
+        sacct = os.path.join(self.tmpdir, 'sacct')
+        with open(sacct, 'w') as f:
+            f.write(FAKE_SACCT.format(python=sys.executable, log=self.log, states=self.states))
+        os.chmod(sacct, 0o755)
+        self.path = os.environ['PATH']
+        os.environ['PATH'] = self.tmpdir + os.pathsep + self.path
+        submit._tracker = None  # fresh shared tracker
+
+    def tearDown(self):
+        os.environ['PATH'] = self.path
+        shutil.rmtree(self.tmpdir)
+
+    def set_states(self, text):
+        with open(self.states, 'w') as f:
+            f.write(text)
+
+    def calls(self):
+        return open(self.log).read().splitlines() if os.path.exists(self.log) else []
+
+    def test_parse(self):
+        states = parse_sacct("10|COMPLETED\n10.batch|COMPLETED\n11|CANCELLED by 0\n12_3|RUNNING\n")
+        self.assertEqual(states, {'10': 'COMPLETED', '11': 'CANCELLED', '12_3': 'RUNNING'})
+
+    def test_poll(self):
+        tracker = SlurmJobTracker([10, 11, 12])
+        self.set_states("10|COMPLETED\n10.batch|COMPLETED\n11|RUNNING\n12_0|COMPLETED\n12_1|PENDING\n")
+        self.assertEqual(tracker.poll(), set(['10', '11']))
+        self.assertEqual([tracker.state(j) for j in (10, 11, 12)], ['COMPLETED', 'RUNNING', 'PENDING'])
+        self.set_states("11|FAILED\n12_0|COMPLETED\n12_1|TIMEOUT\n")
+        self.assertEqual(tracker.poll(), set(['11', '12']))
+        self.assertEqual([tracker.returncode(j) for j in (10, 11, 12)], [0, 1, 1])
+        # one call per poll, finished jobs no longer queried
+        calls = self.calls()
+        self.assertEqual(len(calls), 2)
+        self.assertTrue('--parsable2' in calls[0] and calls[0].endswith('10,11,12'))
+        self.assertTrue(calls[1].endswith('11,12'))
+        self.assertEqual(tracker.poll(), set())
+        self.assertEqual(len(self.calls()), 2)
+
+    def test_wait(self):
+        tracker = SlurmJobTracker([1, 2], interval=0.01)
+        self.set_states("1|COMPLETED\n2|RUNNING\n")
+        done, not_done = tracker.wait(return_when=FIRST_COMPLETED)
+        self.assertEqual((done, not_done), (set(['1']), set(['2'])))
+        done, not_done = tracker.wait(timeout=0.2)
+        self.assertEqual(not_done, set(['2']))
+        self.set_states("2|COMPLETED\n")
+        self.assertEqual(list(tracker.as_completed()), ['1', '2'])
+
+    def test_backoff(self):
+        tracker = SlurmJobTracker([1], interval=0.01, max_interval=0.04, backoff=2)
+        self.set_states("1|PENDING\n")
+        tracker.wait(timeout=0.3)
+        # intervals 0.02, 0.04, 0.04...: far fewer calls than with a fixed interval
+        self.assertTrue(len(self.calls()) < 15)
+
+    def test_process(self):
+        self.set_states("7|RUNNING\n")
+        p = SlurmProcess('7')
+        self.assertTrue(p.running())
+        self.set_states("7|OUT_OF_MEMORY\n")
+        self.assertTrue(p.failed())
+        self.assertEqual(p.wait(), 1)
+
+    def test_processes(self):
+        # jobs submitted separately share one tracker: one sacct call per poll
+        p1, p2 = SlurmProcess('20'), SlurmProcess('21')
+        self.assertTrue(p1.tracker is p2.tracker)
+        self.set_states("20|RUNNING\n21|PENDING\n")
+        self.assertTrue(p1.running())
+        self.assertEqual(self.calls(), ['--parsable2 --noheader --format JobID,State --jobs 20,21'])
+        self.set_states("20|COMPLETED\n21|COMPLETED\n")
+        self.assertEqual(p1.wait(), 0)
+        self.assertEqual(p2.wait(), 0)
+        self.assertEqual(len(self.calls()), 2)
+
+
+class TestRunAsync(TestXRunBase):
+
+    def test_async(self):
+        xrun = self.xrun(max_workers=3)
+        xrun.setup()
+        res = xrun.run_async()
+        self.assertTrue(all(m.status == 'success' for m in res))
+        output = xrun.get_output(['aa', 'bb'])
+        self.assertEqual(output.values.tolist(), np.asarray(xrun.params.values).tolist())
+
+    def test_async_timeout(self):
+        interface = ModelInterface(['sleep', '{a}'])
+        xrun = XRun(Model(interface), dummy_params(), expdir=self.expdir, timeout=1.5)
+        xrun.setup()
+        res = xrun.run_async()
+        self.assertEqual([m is not None for m in res], [True, True, False, False, False, False])
+        self.assertEqual(xrun.get_valid().tolist(), [True, True, False, False, False, False])
+
+
+class TestCache(TestXRunBase):
+
+    def test_cache(self):
+        xrun = self.xrun(store=False, cache=True)
+        xrun.setup()
+        xrun.run(indices=[0, 1])
+        self.assertEqual(xrun.get_valid().sum(), 2)
+
+        # further accessors do not read from disk
+        shutil.rmtree(os.path.join(self.expdir, '0'))
+        self.assertEqual(xrun.get_valid().sum(), 2)
+        self.assertEqual(xrun.get_output(['aa']).values[0, 0], 1)
+
+        # explicit invalidation
+        xrun.clear_cache()
+        self.assertEqual(xrun.get_valid().sum(), 1)
+
+        # invalidated by new runs
+        xrun.get_valid()
+        xrun.run(indices=[2])
+        self.assertEqual(xrun.get_valid().sum(), 2)
+
+
+class TestBatch(TestXRunBase):
+
+    def test_batch(self):
+        xrun = self.xrun(batchsize=4, max_workers=2)
+        xrun.setup()
+        res = xrun.run()
+        self.assertTrue(all(m.status == 'success' for m in res))
+        self.assertEqual([m.output['aa'] for m in res], [1, 1, 2, 2, 3, 3])
+        self.assertEqual(xrun.get_output(['aa', 'bb']).values.tolist(), 
+                         np.asarray(xrun.params.values).tolist())
+
+    def test_batch_failures(self):
+        interface = ModelInterface(['python', '-c', 'import sys; sys.exit({a} == 2)'])
+        xrun = XRun(Model(interface), dummy_params(), expdir=self.expdir, batchsize=3)
+        xrun.setup()
+        res = xrun.run()
+        self.assertEqual([m is not None for m in res], [True, True, False, False, True, True])
+        self.assertEqual(xrun.get_valid().tolist(), [True, True, False, False, True, True])
+
+    def test_manifest(self):
+        interface = ModelInterface(
+            filetype=JsonFile(), filename='params.json',
+            filetype_output=LineSeparator(), filename_output='output',
+            batch_args='python examples/dummy.py --manifest {manifest} --params-file params.json')
+        interface.args = ['false']  # single runs are not used
+        params = XParams(np.asarray(dummy_params().values), names=['aa', 'bb'])
+        xrun = XRun(Model(interface), params, expdir=self.expdir, batchsize=3)
+        xrun.setup()
+        res = xrun.run()
+        self.assertTrue(all(m.status == 'success' for m in res))
+        self.assertEqual(xrun.get_output(['aa', 'bb']).values.tolist(), 
+                         np.asarray(xrun.params.values).tolist())
+        # one model call per batch
+        self.assertEqual(len(glob.glob(os.path.join(self.expdir, '*', 'batch.manifest'))), 2)
+
+
+def _pymodel(params):
+    if params['a'] == 2:
+        raise ValueError('a == 2')
+    return {'aa': params['a'], 'cc': params['a']*10 + params['b']}
+
+
+class TestPythonModel(TestXRunBase):
+
+    def test_python_model(self):
+        xrun = XRun(Model(PythonModelInterface(_pymodel)), dummy_params(), expdir=self.expdir)
+        xrun.setup()
+        res = xrun.run()
+        self.assertEqual([m is not None for m in res], [True, True, False, False, True, True])
+        self.assertEqual(res[-1].output, {'aa': 3, 'cc': 31})
+        # nothing written apart from the store
+        self.assertEqual(sorted(os.listdir(self.expdir)), ['params.txt', 'results.log'])
+        self.assertEqual(xrun.get_output(['cc']).values[:, 0].tolist()[4:], [30, 31])
+        self.assertEqual(xrun.get_valid().tolist(), [True, True, False, False, True, True])
+        # no run directory to postprocess, output kept from the store
+        self.assertEqual(xrun.postprocess(), [None]*6)
+        self.assertEqual(xrun.get_output(['cc']).values[:, 0].tolist()[4:], [30, 31])
+
+    def test_python_model_rundir(self):
+        interface = PythonModelInterface(_pymodel, write_rundir=True)
+        xrun = XRun(Model(interface), dummy_params(), expdir=self.expdir, batchsize=3)
+        xrun.setup()
+        xrun.run()
+        self.assertEqual(_runinfo(xrun[5])['output'], {'aa': 3, 'cc': 31})
+        self.assertEqual(_runinfo(xrun[2])['status'], 'failed')
+
+
+def _vecmodel(xparams):
+    a = xparams.values[:, xparams.names.index('a')]
+    if (a > 2).any():
+        raise ValueError('a > 2')
+    return a[:, None]*10 + xparams.values[:, [xparams.names.index('b')]]
+
+
+class TestVectorModel(TestXRunBase):
+
+    def xrun(self, **kwargs):
+        interface = VectorModelInterface(_vecmodel, output_names=['cc'], chunksize=2)
+        model = Model(interface, likelihood=[Param.parse('cc=N?10,5')])
+        return XRun(model, dummy_params(), expdir=self.expdir, **kwargs)
+
+    def test_run_matrix(self):
+        xrun = self.xrun()
+        xrun.setup()
+        output = xrun.run_matrix()
+        np.testing.assert_equal(output.values[:, 0], [10, 11, 20, 21, np.nan, np.nan])
+        self.assertEqual(xrun.get_valid().tolist(), [True]*4 + [False]*2)
+        self.assertEqual(xrun.get_logliks().values.shape, (6, 1))
+        # nothing but the store on disk
+        self.assertEqual(sorted(os.listdir(self.expdir)), ['params.txt', 'results.npz'])
+
+        # in-memory results and store agree
+        fresh = self.xrun()
+        np.testing.assert_equal(fresh.get_output(['cc']).values, xrun.get_output(['cc']).values)
+        np.testing.assert_equal(fresh._get_params(['a', 'b']).values[:4], 
+                                np.asarray(xrun.params.values)[:4])
+        xrun.postprocess()
+        np.testing.assert_equal(xrun.get_output(['cc']).values, fresh.get_output(['cc']).values)
+
+    def test_partial(self):
+        xrun = self.xrun()
+        xrun.setup()
+        xrun.run_matrix([1, 3])
+        xrun.run_matrix([0])
+        np.testing.assert_equal(xrun.get_output(['cc']).values[:, 0], [10, 11, np.nan, 21, np.nan, np.nan])
+        self.assertEqual(xrun[2].model.interface.run(None, {'a': 2, 'b': 1}), {'cc': 21})
+
+
+class TestRunRecord(TestXRunBase):
+
+    def test_single_write(self):
+        # succeeds only if runner.json was not written before the run
+        interface = ModelInterface(['sh', '-c', 'test ! -e {}/runner.json'], env_prefix='RUNNER_')
+        xrun = XRun(Model(interface), dummy_params(), expdir=self.expdir)
+        xrun.setup()
+        xrun.run(indices=[0])
+        info = _runinfo(xrun[0])
+        self.assertEqual(info['status'], 'success')
+        # environment diff only
+        self.assertEqual(sorted(info['env']), ['RUNNER_RUNDIR', 'RUNNER_a', 'RUNNER_b'])
+
+        # without store, status "running" is recorded before the run
+        xrun = XRun(Model(interface), dummy_params(), expdir=self.expdir, store=False)
+        xrun.run(indices=[1])
+        self.assertEqual(_runinfo(xrun[1])['status'], 'failed')
+
+
+def _runinfo(m):
+    return json.load(open(m.runfile))
+
+
+class TestRunCache(TestXRunBase):
+
+    def test_run_cache(self):
+        cachedir = os.path.join(self.expdir, 'cache')
+        params = XParams(np.array([[1, 0], [2, 0], [1, 0], [1, 0]]), names=['a', 'b'])
+        xrun = XRun(dummy_model(), params, expdir=os.path.join(self.expdir, 'exp1'), run_cache=cachedir)
+        xrun.setup()
+        res = xrun.run()
+        self.assertTrue(all(m.status == 'success' for m in res))
+        self.assertEqual(xrun.get_output(['aa']).values[:, 0].tolist(), [1, 2, 1, 1])
+
+        # duplicates were linked from the first run
+        cached = [_runinfo(m).get('cached_from') for m in res]
+        self.assertEqual([c is not None for c in cached], [False, False, True, True])
+        self.assertEqual(os.path.realpath(cached[2]), os.path.realpath(res[0].rundir))
+        self.assertTrue(os.path.exists(os.path.join(res[2].rundir, 'output')))
+
+        # shared across experiments
+        xrun2 = XRun(dummy_model(), params, expdir=os.path.join(self.expdir, 'exp2'), run_cache=cachedir)
+        xrun2.setup()
+        res = xrun2.run(indices=[1])
+        self.assertIsNotNone(_runinfo(res[0]).get('cached_from'))
+
+    def test_run_cache_rerun(self):
+        # re-running a restored run must not modify the cached one
+        cachedir = os.path.join(self.expdir, 'cache')
+        params = XParams(np.array([[1, 0]]), names=['a', 'b'])
+        xrun = XRun(dummy_model(), params, expdir=os.path.join(self.expdir, 'exp1'), run_cache=cachedir)
+        xrun.setup()
+        source = xrun.run()[0].rundir
+        xrun2 = XRun(dummy_model(), params, expdir=os.path.join(self.expdir, 'exp2'), run_cache=cachedir)
+        xrun2.setup()
+        res = xrun2.run()
+        rundir = res[0].rundir
+        self.assertIsNotNone(_runinfo(res[0]).get('cached_from'))
+
+        logs = [open(os.path.join(source, name)).read() for name in ('log.out', 'log.err')]
+        output = xrun2.model.interface.run(rundir, {'a': 9, 'b': 0})
+        self.assertEqual(output['aa'], 9)
+        self.assertEqual(xrun.get_output(['aa']).values[:, 0].tolist(), [1])
+        self.assertEqual([open(os.path.join(source, name)).read() for name in ('log.out', 'log.err')], logs)
+        self.assertEqual(os.stat(os.path.join(source, 'output')).st_nlink, 1)
+
+    def test_run_cache_restore_nonempty(self):
+        # a cached run restored into a used run directory replaces its files
+        cachedir = os.path.join(self.expdir, 'cache')
+        interface = dummy_model().interface
+        source = os.path.join(self.expdir, 'exp1', '0')
+        rundir = os.path.join(self.expdir, 'exp2', '0')
+        interface.run(source, {'a': 5, 'b': 0}, cache=RunCache(cachedir))
+        interface.run(rundir, {'a': 7, 'b': 0})
+        output = interface.run(rundir, {'a': 5, 'b': 0}, cache=RunCache(cachedir))
+        self.assertEqual(output['aa'], 5)
+        self.assertEqual(json.load(open(os.path.join(rundir, 'runner.json')))['cached_from'], source)
+        self.assertEqual(interface.postprocess(rundir)['aa'], 5)
+
+    def test_run_cache_user_links(self):
+        # files linked by the user are not copied on re-run
+        interface = dummy_model().interface
+        rundir = os.path.join(self.expdir, '0')
+        os.makedirs(rundir)
+        shared = os.path.join(self.expdir, 'restart.nc')
+        open(shared, 'w').close()
+        os.link(shared, os.path.join(rundir, 'restart.nc'))
+        interface.run(rundir, {'a': 1, 'b': 0})
+        interface.run(rundir, {'a': 2, 'b': 0})
+        self.assertTrue(os.path.samefile(shared, os.path.join(rundir, 'restart.nc')))
+
+
+if __name__ == '__main__':
+    unittest.main()